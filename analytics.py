@@ -0,0 +1,94 @@
+import heapq
+from collections import Counter
+from datetime import date
+from itertools import groupby
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PERIODS = ('day', 'week', 'month')
+
+# date(1970, 1, 1).toordinal(), to turn day ordinals into datetime64 days
+EPOCH_ORDINAL = 719163
+
+def _column(values, dtype):
+    return np.frombuffer(values, dtype=dtype) if len(values) else np.zeros(0, dtype=dtype)
+
+def top_senders(index, start_day, end_day, n=10):
+    """Return [(sender, messages, bytes)] for the n busiest senders in the window"""
+    lo, hi = index.bounds(start_day, end_day)
+    senders = index.senders[lo:hi]
+    sizes = index.sizes[lo:hi]
+
+    if np is not None:
+        sender_ids = _column(senders, np.uint32)
+        counts = np.bincount(sender_ids, minlength=len(index.sender_names))
+        totals = np.bincount(sender_ids, weights=_column(sizes, np.uint32), minlength=len(index.sender_names))
+        top = np.argsort(-counts, kind='stable')[:n]
+        return [(index.sender_names[i], int(counts[i]), int(totals[i])) for i in top if counts[i]]
+
+    counts = Counter(senders)
+    totals = Counter()
+    for sender_id, size in zip(senders, sizes):
+        totals[sender_id] += size
+    return [(index.sender_names[i], count, totals[i]) for i, count in counts.most_common(n)]
+
+def volume_by_period(index, start_day, end_day, period='day'):
+    """Return [(period start date, messages, bytes)] for the window, oldest first"""
+    lo, hi = index.bounds(start_day, end_day)
+    days = index.days[lo:hi]
+    sizes = index.sizes[lo:hi]
+
+    if np is not None:
+        keys = _column(days, np.int32).astype(np.int64) - EPOCH_ORDINAL
+        if period == 'week':
+            # Ordinal 1 is a Monday, so weeks start on Mondays
+            keys = keys - (keys + EPOCH_ORDINAL - 1) % 7
+        elif period == 'month':
+            keys = keys.astype('datetime64[D]').astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+        # Rows are sorted by day, so each period is one run
+        starts, first_rows, counts = np.unique(keys, return_index=True, return_counts=True)
+        if not len(starts):
+            return []
+        totals = np.add.reduceat(_column(sizes, np.uint32).astype(np.int64), first_rows)
+        return [(date.fromordinal(int(start) + EPOCH_ORDINAL), int(count), int(total))
+                for start, count, total in zip(starts, counts, totals)]
+
+    def period_start(day):
+        if period == 'week':
+            return day - (day - 1) % 7
+        if period == 'month':
+            return date.fromordinal(day).replace(day=1).toordinal()
+        return day
+
+    results = []
+    for start, rows in groupby(zip(days, sizes), key=lambda row: period_start(row[0])):
+        rows = list(rows)
+        results.append((date.fromordinal(start), len(rows), sum(size for _, size in rows)))
+    return results
+
+def window_summary(index, start_day, end_day):
+    """Return (messages, bytes) in the window"""
+    lo, hi = index.bounds(start_day, end_day)
+    if np is not None:
+        return hi - lo, int(_column(index.sizes[lo:hi], np.uint32).sum(dtype=np.int64))
+    return hi - lo, sum(index.sizes[lo:hi])
+
+def largest_messages(index, start_day, end_day, n=20):
+    """Return [(uid, day, sender, bytes)] for the n largest messages in the window, largest first"""
+    lo, hi = index.bounds(start_day, end_day)
+    if n <= 0 or hi <= lo:
+        return []
+
+    if np is not None:
+        sizes = _column(index.sizes[lo:hi], np.uint32)
+        if n < len(sizes):
+            rows = np.argpartition(sizes, len(sizes) - n)[len(sizes) - n:]
+        else:
+            rows = np.arange(len(sizes))
+        rows = rows[np.argsort(-sizes[rows].astype(np.int64), kind='stable')] + lo
+    else:
+        rows = heapq.nlargest(n, range(lo, hi), key=index.sizes.__getitem__)
+    return [(index.uids[i], index.days[i], index.sender_names[index.senders[i]], index.sizes[i]) for i in rows]
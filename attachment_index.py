@@ -0,0 +1,152 @@
+from array import array
+from email.utils import collapse_rfc2231_value, decode_params, unquote
+
+def _text(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return '' if value is None else str(value)
+
+def _params(values):
+    """BODYSTRUCTURE parameter list -> {lowercase name: value}
+
+    RFC 2231 parameters (filename*=UTF-8''..., filename*0*=... continuations)
+    are percent-decoded and joined under their plain name.
+    """
+    if not isinstance(values, list):
+        return {}
+    pairs = [(_text(values[i]).lower(), _text(values[i + 1])) for i in range(0, len(values) - 1, 2)]
+    params = {}
+    # decode_params treats its first pair as the main value and leaves it alone
+    for name, value in decode_params([('', '')] + pairs)[1:]:
+        params[name] = unquote(collapse_rfc2231_value(value))
+    return params
+
+def _single_part_attachment(part, decode_name):
+    """(filename, mime type, size) for a non-multipart BODYSTRUCTURE, or None"""
+    if len(part) < 7:
+        return None
+    mime_type = f"{_text(part[0])}/{_text(part[1])}".lower()
+    encoding = _text(part[5]).lower()
+    try:
+        size = int(part[6])
+    except (TypeError, ValueError):
+        size = 0
+    if encoding == 'base64':
+        # Report the decoded size, which is what the user will download
+        size = size * 3 // 4
+
+    # Extension data follows the basic fields, and text/* and message/rfc822 add their own
+    extension = 7
+    if mime_type.startswith('text/'):
+        extension = 8
+    elif mime_type == 'message/rfc822':
+        extension = 10
+    disposition = part[extension + 1] if len(part) > extension + 1 else None
+
+    filename = ''
+    is_attachment = False
+    if isinstance(disposition, list) and disposition:
+        is_attachment = _text(disposition[0]).lower() == 'attachment'
+        filename = _params(disposition[1] if len(disposition) > 1 else None).get('filename', '')
+    if not filename:
+        filename = _params(part[2]).get('name', '')
+    if not filename and not is_attachment:
+        return None
+    return decode_name(filename) if filename else '(unnamed)', mime_type, size
+
+def walk_bodystructure(structure, decode_name=str):
+    """Yield (filename, mime type, size) for every attachment in a BODYSTRUCTURE"""
+    if not isinstance(structure, list) or not structure:
+        return
+    if isinstance(structure[0], list):
+        # Multipart: child parts come first, then the subtype and extension data
+        for child in structure:
+            if not isinstance(child, list) or not child or not isinstance(child[0], (list, bytes)):
+                break
+            yield from walk_bodystructure(child, decode_name)
+        return
+    attachment = _single_part_attachment(structure, decode_name)
+    if attachment:
+        yield attachment
+
+class AttachmentIndex:
+    """Attachment filename, MIME type and size per message, built from BODYSTRUCTURE
+
+    One row per attachment in parallel columns; MIME types are interned.
+    Searches scan the rows locally, so no payload is ever downloaded.
+    """
+
+    def __init__(self):
+        self.uids = array('I')
+        self.sizes = array('I')
+        self.types = array('H')   # ids into type_names
+        self.filenames = []
+        self.type_names = []
+        self.type_ids = {}
+        self.indexed = set()      # uids whose structure has been seen
+
+    def __len__(self):
+        return len(self.uids)
+
+    def add(self, uid, attachments):
+        if uid in self.indexed:
+            return
+        self.indexed.add(uid)
+        for filename, mime_type, size in attachments:
+            type_id = self.type_ids.get(mime_type)
+            if type_id is None:
+                type_id = self.type_ids[mime_type] = len(self.type_names)
+                self.type_names.append(mime_type)
+            self.uids.append(uid)
+            self.sizes.append(min(size, 0xFFFFFFFF))
+            self.types.append(type_id)
+            self.filenames.append(filename)
+
+    def discard_missing(self, live_uids):
+        live_uids = set(live_uids)
+        rows = [row for row in zip(self.uids, self.sizes, self.types, self.filenames) if row[0] in live_uids]
+        if len(rows) != len(self.uids):
+            self.uids = array('I', (row[0] for row in rows))
+            self.sizes = array('I', (row[1] for row in rows))
+            self.types = array('H', (row[2] for row in rows))
+            self.filenames = [row[3] for row in rows]
+        self.indexed &= live_uids
+
+    def clear(self):
+        self.__init__()
+
+    def attachments_of(self, uids):
+        """Return {uid: [(filename, mime type, size)]} for the given uids"""
+        uids = set(uids)
+        found = {}
+        for uid, size, type_id, filename in zip(self.uids, self.sizes, self.types, self.filenames):
+            if uid in uids:
+                found.setdefault(uid, []).append((filename, self.type_names[type_id], size))
+        return found
+
+    def search(self, name=None, mime_type=None, min_size=None, max_size=None):
+        """Return [(uid, filename, mime type, size)] matching every given filter, newest first
+
+        name matches a substring of the filename; mime_type matches a
+        substring of the MIME type or the file extension (e.g. "pdf").
+        """
+        name = name.casefold() if name else None
+        mime_type = mime_type.casefold() if mime_type else None
+        matching_types = None
+        if mime_type:
+            matching_types = {i for i, type_name in enumerate(self.type_names) if mime_type in type_name}
+
+        results = []
+        for uid, size, type_id, filename in zip(self.uids, self.sizes, self.types, self.filenames):
+            if min_size is not None and size < min_size:
+                continue
+            if max_size is not None and size > max_size:
+                continue
+            folded = filename.casefold()
+            if name and name not in folded:
+                continue
+            if mime_type and type_id not in matching_types and not folded.endswith('.' + mime_type):
+                continue
+            results.append((uid, filename, self.type_names[type_id], size))
+        results.sort(key=lambda row: row[0], reverse=True)
+        return results
@@ -0,0 +1,68 @@
+"""Fixed-size batching vs. the adaptive fetch scheduler against the fake IMAP server
+
+Run from the project root: python benchmarks/bench_fetch_scheduler.py [messages]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_imap import FakeImapServer
+from fetch_scheduler import AimdController, FetchScheduler
+from metrics import metrics
+
+HEADER_ITEMS = "(RFC822.SIZE BODY.PEEK[HEADER])"
+
+SCENARIOS = [
+    ("small headers, fast link", dict(rtt=0.02, per_message=0.00001, message_bytes=600)),
+    ("high latency link", dict(rtt=0.25, per_message=0.00002, message_bytes=600)),
+    ("large responses, 4 MB/s", dict(rtt=0.05, per_message=0.00005, message_bytes=6000, bandwidth=4_000_000)),
+    ("throttled above 2 requests", dict(rtt=0.1, per_message=0.0001, message_bytes=600, max_in_flight=2)),
+    ("3 connections allowed", dict(rtt=0.1, per_message=0.0001, message_bytes=600, max_connections=3)),
+]
+
+class FakeClient:
+    """The two attributes FetchScheduler needs from GmailClient"""
+
+    def __init__(self, server):
+        self.server = server
+        self.imap = server.session()
+
+    def open_connection(self, readonly=False):
+        return self.server.session()
+
+def run(server, controller):
+    client = FakeClient(server)
+    scheduler = FetchScheduler(client, controller)
+    fetched = 0
+    start = time.perf_counter()
+    # Two passes, like a sync followed by a long list: the second reuses what the first learned
+    for _ in range(2):
+        for batch, msg_data in scheduler.fetch(server.uids(), HEADER_ITEMS):
+            fetched += len(batch)
+    elapsed = time.perf_counter() - start
+    client.imap.logout()
+    return elapsed, fetched
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    print(f"{count} messages fetched twice per run")
+    print(f"{'SCENARIO':<30} {'FIXED 500x1':>12} {'ADAPTIVE':>10} {'SPEEDUP':>8} {'FINAL CHUNK':>12} {'IN-FLIGHT':>10}")
+    for name, settings in SCENARIOS:
+        fixed_time, fixed_count = run(FakeImapServer(count, **settings),
+                                      AimdController(chunk=500, min_chunk=500, max_chunk=500, max_in_flight=1))
+        controller = AimdController()
+        adaptive_time, adaptive_count = run(FakeImapServer(count, **settings), controller)
+        assert fixed_count == adaptive_count == 2 * count, "messages lost"
+        print(f"{name:<30} {fixed_time:>11.2f}s {adaptive_time:>9.2f}s {fixed_time / adaptive_time:>7.2f}x "
+              f"{controller.chunk:>12} {controller.in_flight:>10}")
+
+    _, events = metrics.recent(count=8)
+    print("\nLast tuning decisions:")
+    for when, event, message in events:
+        print(f"  {message}")
+
+if __name__ == '__main__':
+    main()
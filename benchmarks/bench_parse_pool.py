@@ -0,0 +1,76 @@
+"""Header parsing throughput on 100k synthetic headers, in-process vs. worker pools of growing size
+
+Run from the project root: python benchmarks/bench_parse_pool.py [headers]
+"""
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from config import SYNC_BATCH_SIZE
+from header_parser import parse_header_batch
+
+SENDERS = ['Alice Example <alice@example.com>', '=?UTF-8?Q?J=C3=BCrgen_M=C3=BCller?= <jm@example.de>',
+           'billing@shop.com', '"Support Team" <support@service.io>']
+SUBJECTS = ['Invoice {n}', 'Re: Meeting notes {n}', '=?UTF-8?B?w5xiZXJzaWNodCB7bn0=?=', 'Your receipt #{n}']
+
+def make_headers(count):
+    random.seed(1)
+    records = []
+    for n in range(count):
+        header = (
+            f"Return-Path: <bounce-{n}@example.com>\r\n"
+            f"Received: from mail{n % 50}.example.com by mx.google.com; Mon, 7 Jul 2025 10:{n % 60:02d}:00 +0000\r\n"
+            f"From: {random.choice(SENDERS)}\r\n"
+            f"To: me@gmail.com\r\n"
+            f"Subject: {random.choice(SUBJECTS).format(n=n)}\r\n"
+            f"Date: Mon, 7 Jul 2025 10:{n % 60:02d}:{n % 60:02d} +0200\r\n"
+            f"Message-ID: <{n}.{random.getrandbits(32)}@example.com>\r\n"
+            f"MIME-Version: 1.0\r\n"
+            f"Content-Type: multipart/mixed; boundary=\"b{n}\"\r\n\r\n"
+        ).encode()
+        records.append((str(n + 1), header, len(header) * 20))
+    return records
+
+def batches(records):
+    return [records[i:i + SYNC_BATCH_SIZE] for i in range(0, len(records), SYNC_BATCH_SIZE)]
+
+def run_inline(records):
+    start = time.perf_counter()
+    parsed = [row for batch in batches(records) for row in parse_header_batch(batch)]
+    return time.perf_counter() - start, parsed
+
+def run_pool(records, workers):
+    context = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else None)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        # Warm the workers up so process start-up is not counted
+        list(executor.map(parse_header_batch, [[]] * workers))
+        start = time.perf_counter()
+        parsed = [row for rows in executor.map(parse_header_batch, batches(records)) for row in rows]
+        return time.perf_counter() - start, parsed
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    records = make_headers(count)
+    cores = os.cpu_count() or 1
+    print(f"{count} headers, {SYNC_BATCH_SIZE} per batch, {cores} cores")
+    print(f"{'MODE':<14} {'SECONDS':>10} {'HEADERS/S':>12} {'SPEEDUP':>9}")
+
+    baseline, expected = run_inline(records)
+    print(f"{'in-process':<14} {baseline:>10.2f} {count / baseline:>12.0f} {1.0:>8.2f}x")
+
+    workers = 1
+    while True:
+        elapsed, parsed = run_pool(records, workers)
+        assert [row['uid'] for row in parsed] == [row['uid'] for row in expected], "results out of order"
+        print(f"{f'{workers} workers':<14} {elapsed:>10.2f} {count / elapsed:>12.0f} {baseline / elapsed:>8.2f}x")
+        if workers >= cores:
+            break
+        workers = min(workers * 2, cores)
+
+if __name__ == '__main__':
+    main()
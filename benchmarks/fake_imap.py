@@ -0,0 +1,107 @@
+"""In-process stand-in for Gmail's IMAP server with injected latency, bandwidth and throttling
+
+Sessions mimic the subset of ImapSession the fetch paths use, so a client can
+be pointed at a FakeImapServer instead of imap.gmail.com.
+"""
+import imaplib
+import threading
+import time
+
+class FakeImapServer:
+    """A mailbox of count messages served with configurable costs
+
+    rtt: seconds added to every command
+    per_message: server-side seconds per fetched message (runs in parallel across connections)
+    message_bytes: response bytes per fetched message
+    bandwidth: bytes per second shared by all connections, None for unlimited
+    max_connections: logins beyond this fail with Gmail's "Too many simultaneous connections"
+    max_in_flight: concurrent FETCHes beyond this get a [THROTTLED] NO response
+    """
+
+    def __init__(self, count=10000, rtt=0.05, per_message=0.00002, message_bytes=600,
+                 bandwidth=None, max_connections=15, max_in_flight=None):
+        self.count = count
+        self.rtt = rtt
+        self.per_message = per_message
+        self.message_bytes = message_bytes
+        self.bandwidth = bandwidth
+        self.max_connections = max_connections
+        self.max_in_flight = max_in_flight
+        self.lock = threading.Lock()
+        self.link = threading.Lock()   # held while bytes are "on the wire"
+        self.connections = 0
+        self.in_flight = 0
+        self.fetches = 0
+
+    def session(self):
+        session = FakeSession(self)
+        session.open()
+        return session
+
+    def uids(self):
+        return list(range(1, self.count + 1))
+
+    def fetch(self, message_set):
+        with self.lock:
+            self.in_flight += 1
+            self.fetches += 1
+            throttled = self.max_in_flight is not None and self.in_flight > self.max_in_flight
+        try:
+            time.sleep(self.rtt)
+            if throttled:
+                return 'NO', [b'[THROTTLED] Account exceeded command or bandwidth limits. (Failure)']
+            uids = parse_uid_set(message_set)
+            time.sleep(len(uids) * self.per_message)
+            header = b'X' * max(self.message_bytes - 2, 0) + b'\r\n'
+            if self.bandwidth:
+                with self.link:
+                    time.sleep(len(uids) * len(header) / self.bandwidth)
+            msg_data = []
+            for i, uid in enumerate(uids, 1):
+                msg_data.append((f'{i} (UID {uid} RFC822.SIZE {len(header) * 10} BODY[HEADER] {{{len(header)}}}'.encode(), header))
+                msg_data.append(b')')
+            return 'OK', msg_data
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+class FakeSession:
+    def __init__(self, server):
+        self.server = server
+        self.logged_in = False
+        self.capabilities = ('IMAP4REV1',)
+
+    def open(self):
+        with self.server.lock:
+            if self.server.connections >= self.server.max_connections:
+                raise imaplib.IMAP4.error('[ALERT] Too many simultaneous connections. (Failure)')
+            self.server.connections += 1
+        self.logged_in = True
+        time.sleep(self.server.rtt * 3)  # TLS handshake, LOGIN and SELECT
+        return 'OK', [b'Logged in']
+
+    def uid(self, command, *args):
+        if command.upper() == 'FETCH':
+            return self.server.fetch(args[0])
+        if command.upper() == 'SEARCH':
+            time.sleep(self.server.rtt)
+            return 'OK', [' '.join(map(str, self.server.uids())).encode()]
+        raise imaplib.IMAP4.error(f"{command} not supported by the fake server")
+
+    def noop(self):
+        time.sleep(self.server.rtt)
+        return 'OK', [b'']
+
+    def logout(self):
+        if self.logged_in:
+            self.logged_in = False
+            with self.server.lock:
+                self.server.connections -= 1
+        return 'BYE', [b'']
+
+def parse_uid_set(message_set):
+    uids = []
+    for part in message_set.split(','):
+        first, _, last = part.partition(':')
+        uids.extend(range(int(first), int(last or first) + 1))
+    return uids
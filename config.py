@@ -1,3 +1,5 @@
+import os
+
 # Gmail Configuration (will be set at runtime)
 EMAIL = None
 PASSWORD = None
@@ -9,8 +11,52 @@ DEFAULT_DATE_LIMIT = 10
 # IMAP settings
 IMAP_SERVER = "imap.gmail.com"
 IMAP_PORT = 993
+IMAP_TIMEOUT = 60  # seconds before a stalled socket counts as dead
+KEEPALIVE_INTERVAL = 240  # seconds of idle before a keepalive NOOP
+SESSION_CHECK_AFTER = 60  # seconds of idle before a command is preceded by a NOOP
+RECONNECT_ATTEMPTS = 3
 
 # Display settings
 MAX_SUBJECT_LENGTH = 50
 MAX_FROM_LENGTH = 30
 MAX_BODY_PREVIEW = 1000
+
+# Local sync settings
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".gmail_client")
+SYNC_BATCH_SIZE = 500  # first FETCH batch size, tuned from there (see below)
+SYNC_INTERVAL = 30  # seconds between mailbox change checks
+DATE_INDEX_SYNC_DAYS = None  # None indexes the whole mailbox
+SYNC_CHECKPOINT = 5000  # messages indexed between saves during a long sync
+SYNC_MAX_ATTEMPTS = 3  # syncs that may fail to index a message before it is skipped
+
+# Background prefetch of bodies for the top listed emails
+PREFETCH_COUNT = 5  # 0 disables prefetching
+PREFETCH_BYTE_BUDGET = 5 * 1024 * 1024
+
+# Search result cache
+QUERY_CACHE_SIZE = 100  # entries, 0 disables caching
+QUERY_CACHE_TTL = 600  # seconds
+
+# Terminal output
+PAGER_ENABLED = True  # page long lists one screen at a time
+PROGRESS_FPS = 10  # progress line redraws per second
+
+# Subject/sender trigram search
+FUZZY_THRESHOLD = 0.4  # minimum share of query trigrams for a fuzzy match
+
+# Header parsing in worker processes for large fetches
+PARSE_POOL_THRESHOLD = 2000  # messages per fetch before parsing moves to worker processes
+PARSE_WORKERS = None  # None uses one worker per CPU core
+
+# Adaptive FETCH scheduling
+FETCH_TARGET_LATENCY = 2.0  # seconds per batch before batches shrink
+FETCH_MIN_CHUNK = 50
+FETCH_MAX_CHUNK = 5000
+FETCH_MAX_IN_FLIGHT = 4  # parallel FETCH connections; Gmail allows 15 per account
+FETCH_BACKOFF = 1.0  # seconds after a throttle response, doubled while throttling continues
+FETCH_BACKOFF_MAX = 30
+FETCH_MAX_RETRIES = 5  # throttled retries in a row before a fetch gives up
+
+# Live count preview in the date range picker
+PREVIEW_SAMPLES = 2  # sample subjects shown under the count, when the terminal has room
+PREVIEW_DEBOUNCE = 0.4  # seconds the range must stay unchanged before it is counted
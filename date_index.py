@@ -0,0 +1,145 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from heapq import merge
+from operator import itemgetter
+
+MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
+}
+
+INTERNALDATE_RE = re.compile(rb'(\d{1,2})-([A-Za-z]{3})-(\d{4})')
+UID_RE = re.compile(rb'UID (\d+)')
+
+# Out-of-order rows up to this many are inserted in place instead of merging the whole index
+INSERT_LIMIT = 64
+
+def parse_internaldate_day(internaldate):
+    """Return the date ordinal of an INTERNALDATE value, ignoring time and zone like IMAP SINCE/BEFORE do"""
+    match = INTERNALDATE_RE.search(internaldate or b'')
+    if not match:
+        return None
+    day, month, year = match.groups()
+    return date(int(year), MONTHS[month.decode().lower()], int(day)).toordinal()
+
+def _unique(rows):
+    """Sorted rows with one row per (day, uid), the last one winning"""
+    unique = []
+    for row in rows:
+        if unique and unique[-1][:2] == row[:2]:
+            unique[-1] = row
+        else:
+            unique.append(row)
+    return unique
+
+class DateIndex:
+    """Columnar header store for a single mailbox, sorted by (internal date, UID)
+
+    Rows live in parallel arrays (day, uid, sender id, size) ordered by
+    (day, uid), so a date range maps to one contiguous slice found by
+    bisection and analytics can group that slice without touching Python
+    objects per message. Senders are interned to small integer ids. Arrays
+    keep the footprint at 16 bytes per message, which matters for large
+    mailboxes.
+    """
+
+    def __init__(self):
+        self.days = array('i')    # day ordinals, ascending
+        self.uids = array('I')    # uids, ascending within each day
+        self.senders = array('I') # ids into sender_names
+        self.sizes = array('I')   # RFC822.SIZE in bytes
+        self.sender_names = ['']  # id -> lowercased sender address, 0 is unknown
+        self.sender_ids = {'': 0}
+        self.covered_since = None # first day fully indexed, None for the whole mailbox
+
+    def __len__(self):
+        return len(self.uids)
+
+    def sender_id(self, sender):
+        sender_id = self.sender_ids.get(sender)
+        if sender_id is None:
+            sender_id = self.sender_ids[sender] = len(self.sender_names)
+            self.sender_names.append(sender)
+        return sender_id
+
+    def _position(self, uid, day):
+        lo, hi = self.bounds(day, day)
+        return bisect_left(self.uids, uid, lo, hi)
+
+    def add_many(self, entries):
+        """Add a batch of (uid, day, sender, size) rows, replacing rows already indexed
+
+        New mail sorts after the last row and is appended in place. A few
+        older rows are inserted one by one; larger batches are merged with
+        the existing rows in one pass.
+        """
+        if not entries:
+            return
+        rows = _unique(sorted((day, uid, self.sender_id(sender), size) for uid, day, sender, size in entries))
+        tail = (self.days[-1], self.uids[-1]) if self.uids else None
+        if tail is None or rows[0][:2] > tail:
+            self._extend(rows)
+        elif len(rows) <= INSERT_LIMIT:
+            for row in rows:
+                self._insert(row)
+        else:
+            self._rebuild(_unique(merge(self._rows(), rows, key=itemgetter(0, 1))))
+
+    def _extend(self, rows):
+        self.days.extend(row[0] for row in rows)
+        self.uids.extend(row[1] for row in rows)
+        self.senders.extend(row[2] for row in rows)
+        self.sizes.extend(row[3] for row in rows)
+
+    def _insert(self, row):
+        day, uid, sender_id, size = row
+        position = self._position(uid, day)
+        if position < len(self.uids) and self.days[position] == day and self.uids[position] == uid:
+            self.senders[position] = sender_id
+            self.sizes[position] = size
+            return
+        self.days.insert(position, day)
+        self.uids.insert(position, uid)
+        self.senders.insert(position, sender_id)
+        self.sizes.insert(position, size)
+
+    def discard_missing(self, live_uids):
+        """Drop expunged messages, keeping only uids present in live_uids"""
+        live_uids = set(live_uids)
+        kept = [row for row in self._rows() if row[1] in live_uids]
+        if len(kept) != len(self.uids):
+            self._rebuild(kept)
+
+    def clear(self):
+        self.__init__()
+
+    def _rows(self):
+        return zip(self.days, self.uids, self.senders, self.sizes)
+
+    def _rebuild(self, rows):
+        self.days = array('i', (row[0] for row in rows))
+        self.uids = array('I', (row[1] for row in rows))
+        self.senders = array('I', (row[2] for row in rows))
+        self.sizes = array('I', (row[3] for row in rows))
+
+    def bounds(self, start_day, end_day):
+        """Slice [lo, hi) of the rows with start_day <= day <= end_day"""
+        return bisect_left(self.days, start_day), bisect_right(self.days, end_day)
+
+    def count(self, start_day, end_day):
+        """Number of indexed messages with start_day <= day <= end_day"""
+        lo, hi = self.bounds(start_day, end_day)
+        return hi - lo
+
+    def range(self, start_day, end_day):
+        """UIDs of indexed messages with start_day <= day <= end_day"""
+        lo, hi = self.bounds(start_day, end_day)
+        return self.uids[lo:hi].tolist()
+
+    def uncovered(self, start_day, end_day):
+        """Part of [start_day, end_day] lying before the indexed window, or None"""
+        if self.covered_since is None or start_day >= self.covered_since:
+            return None
+        return start_day, min(end_day, self.covered_since - 1)
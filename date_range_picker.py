@@ -1,6 +1,11 @@
 import npyscreen
 import datetime
 from dateutil.relativedelta import relativedelta
+from config import PREVIEW_SAMPLES
+from terminal import fit
+
+CUSTOM_RANGE = 7  # index of "Custom range" in the presets
+BELOW_PREVIEW = 8  # rows the instructions and the OK/Cancel buttons need under the preview
 
 class DateRangeForm(npyscreen.ActionForm):
     def create(self):
@@ -67,6 +72,21 @@ class DateRangeForm(npyscreen.ActionForm):
         # Add some spacing
         self.add(npyscreen.FixedText, value="")
         
+        # Live preview of what the selected range holds, with as many sample
+        # subjects as the terminal has rows to spare
+        self.preview = getattr(self.parentApp, 'preview', None)
+        spare = self.lines - self.nextrely - BELOW_PREVIEW
+        if spare < 2:
+            # Not even the count fits, a smaller picker beats no picker
+            self.preview = None
+        if self.preview:
+            self.preview_count = self.add(npyscreen.TitleFixedText, name="🔎 PREVIEW", 
+                                          value="Counting...", editable=False,
+                                          begin_entry_at=12, labelColor="GOOD")
+            self.preview_subjects = [self.add(npyscreen.FixedText, value="", editable=False)
+                                     for _ in range(min(PREVIEW_SAMPLES, spare - 2))]
+            self.add(npyscreen.FixedText, value="")
+        
         # Instructions
         self.add(npyscreen.TitleText, name="💡 Instructions:", 
                  editable=False, color="LABEL")
@@ -80,7 +100,7 @@ class DateRangeForm(npyscreen.ActionForm):
         # Handle preset selection
         if self.preset_select.value:
             preset_index = self.preset_select.value[0]
-            if preset_index < 7:  # Not custom range
+            if preset_index < CUSTOM_RANGE:
                 self.apply_preset(preset_index)
         
         # Validate dates
@@ -120,47 +140,112 @@ class DateRangeForm(npyscreen.ActionForm):
         self.parentApp.date_range_result = {'confirmed': False}
         self.parentApp.setNextForm(None)
     
-    def apply_preset(self, preset_index):
-        """Apply a preset date range"""
+    def preset_range(self, preset_index):
+        """Start and end date of a preset"""
         today = datetime.date.today()
         
         if preset_index == 0:  # Last 7 days
-            self.start_date.value = today - relativedelta(days=7)
-            self.end_date.value = today
+            return today - relativedelta(days=7), today
         elif preset_index == 1:  # Last 30 days
-            self.start_date.value = today - relativedelta(days=30)
-            self.end_date.value = today
+            return today - relativedelta(days=30), today
         elif preset_index == 2:  # Last 3 months
-            self.start_date.value = today - relativedelta(months=3)
-            self.end_date.value = today
+            return today - relativedelta(months=3), today
         elif preset_index == 3:  # Last 6 months
-            self.start_date.value = today - relativedelta(months=6)
-            self.end_date.value = today
+            return today - relativedelta(months=6), today
         elif preset_index == 4:  # This month
-            self.start_date.value = today.replace(day=1)
-            self.end_date.value = today
+            return today.replace(day=1), today
         elif preset_index == 5:  # Last month
             last_month = today - relativedelta(months=1)
-            self.start_date.value = last_month.replace(day=1)
             # Last day of last month
-            self.end_date.value = today.replace(day=1) - relativedelta(days=1)
+            return last_month.replace(day=1), today.replace(day=1) - relativedelta(days=1)
         elif preset_index == 6:  # This year
-            self.start_date.value = today.replace(month=1, day=1)
-            self.end_date.value = today
+            return today.replace(month=1, day=1), today
+        return self.start_date.value, self.end_date.value
+    
+    def selected_range(self):
+        """The range a search would use: the selected preset, or the dates above"""
+        if self.preset_select.value and self.preset_select.value[0] < CUSTOM_RANGE:
+            return self.preset_range(self.preset_select.value[0])
+        return self.start_date.value, self.end_date.value
+    
+    def apply_preset(self, preset_index):
+        """Apply a preset date range"""
+        self.start_date.value, self.end_date.value = self.preset_range(preset_index)
         
         # Refresh the display
         self.start_date.display()
         self.end_date.display()
 
+    def adjust_widgets(self):
+        """Called after every keystroke"""
+        self.update_preview()
+    
+    def while_waiting(self):
+        """Called when no key was pressed for keypress_timeout"""
+        self.update_preview()
+    
+    def update_preview(self):
+        """Ask for a count of the selected range and show the latest answer, never waiting for it"""
+        if not self.preview:
+            return
+        start, end = self.selected_range()
+        if not start or not end:
+            self.show_preview("Pick both dates to see how many emails match", [])
+            return
+        if start > end:
+            self.show_preview("⚠️ Start date is after end date", [])
+            return
+        
+        self.preview.request(start, end)
+        result = self.preview.latest()
+        if not result or (result['start'], result['end']) != (start, end):
+            self.show_preview("Counting...", None)
+            return
+        
+        if result['error']:
+            self.show_preview(f"⚠️ Preview unavailable: {result['error']}", [])
+            return
+        summary = f"📬 {result['count']:,} emails in this range ({result['source']})"
+        try:
+            limit = int(self.search_limit.value)
+            if 0 < limit < result['count']:
+                summary += f", the newest {limit} will be fetched"
+        except ValueError:
+            pass
+        self.show_preview(summary, result['subjects'])
+    
+    def show_preview(self, summary, subjects):
+        """Update the preview lines; subjects=None keeps the current samples"""
+        if self.preview_count.value != summary:
+            self.preview_count.value = summary
+            self.preview_count.display()
+        if subjects is None:
+            return
+        for i, line in enumerate(self.preview_subjects):
+            value = f"  • {fit(subjects[i], 70)}" if i < len(subjects) else ""
+            if line.value != value:
+                line.value = value
+                line.display()
+
 class DateRangeApp(npyscreen.NPSAppManaged):
+    # Tenths of a second between while_waiting calls, which refresh the preview
+    keypress_timeout_default = 2
+    
+    def __init__(self, preview=None):
+        super().__init__()
+        self.preview = preview
+    
     def onStart(self):
         self.addForm("MAIN", DateRangeForm, name="Date Range Picker")
         self.date_range_result = {'confirmed': False}
 
-def get_date_range():
-    """Main function to get date range from user"""
+def get_date_range(preview=None):
+    """Main function to get date range from user
+    
+    preview is an optional RangePreview that shows a live count of the range.
+    """
     try:
-        app = DateRangeApp()
+        app = DateRangeApp(preview)
         app.run()
         return app.date_range_result
     except KeyboardInterrupt:
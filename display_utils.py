@@ -1,4 +1,6 @@
+import time
 from config import MAX_SUBJECT_LENGTH, MAX_FROM_LENGTH, MAX_BODY_PREVIEW
+from terminal import fit, clean, page, write_frame
 
 def display_email_list(emails, show_scores=False):
     """Display email list in table format with optional relevance scores"""
@@ -6,28 +8,29 @@ def display_email_list(emails, show_scores=False):
         print("📭 No emails to display")
         return
     
-    print("\n📧 EMAIL LIST")
-    print("=" * 130)
-    
+    # Build the whole table and hand it to the pager in one go
     if show_scores:
-        print(f"{'#':<3} {'UID':<8} {'SCORE':<6} {'FROM':<30} {'SUBJECT':<45} {'DATE':<25}")
+        columns = f"{'#':<3} {'UID':<8} {'SCORE':<6} {'FROM':<30} {'SUBJECT':<45} {'DATE':<25}"
+        subject_width = 45
     else:
-        print(f"{'#':<3} {'UID':<8} {'FROM':<30} {'SUBJECT':<50} {'DATE':<25}")
-    print("-" * 130)
+        columns = f"{'#':<3} {'UID':<8} {'FROM':<30} {'SUBJECT':<50} {'DATE':<25}"
+        subject_width = MAX_SUBJECT_LENGTH
+    header = ["", "📧 EMAIL LIST", "=" * 130, columns, "-" * 130]
     
+    rows = []
     for i, email in enumerate(emails, 1):
         uid = email['uid']
-        from_addr = email['from'][:MAX_FROM_LENGTH-2] + "..." if len(email['from']) > MAX_FROM_LENGTH else email['from']
+        from_addr = fit(email['from'], MAX_FROM_LENGTH)
+        subject = fit(email['subject'], subject_width)
+        date = clean(email['date'])[:25]
         
         if show_scores:
-            subject = email['subject'][:43] + "..." if len(email['subject']) > 45 else email['subject']
             score = email.get('relevance_score', 0)
-            print(f"{i:<3} {uid:<8} {score:<6} {from_addr:<30} {subject:<45} {email['date'][:25]}")
+            rows.append(f"{i:<3} {uid:<8} {score:<6} {from_addr} {subject} {date}")
         else:
-            subject = email['subject'][:MAX_SUBJECT_LENGTH-2] + "..." if len(email['subject']) > MAX_SUBJECT_LENGTH else email['subject']
-            print(f"{i:<3} {uid:<8} {from_addr:<30} {subject:<50} {email['date'][:25]}")
+            rows.append(f"{i:<3} {uid:<8} {from_addr} {subject} {date}")
     
-    print("=" * 130)
+    page(rows + ["=" * 130], header=header)
 
 def display_email_brief(email_data):
     """Display email in brief format"""
@@ -58,3 +61,98 @@ def display_email_brief(email_data):
         print("    [NO BODY CONTENT]")
     
     print("=" * 100)
+
+def format_bytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+def display_analytics(report):
+    """Display top senders and volume per period"""
+    if not report:
+        return
+    
+    lines = ["", f"📈 MAILBOX ANALYTICS ({report['label']})", "=" * 80,
+             f"Messages: {report['messages']}    Total size: {format_bytes(report['bytes'])}"]
+    
+    if not report['messages']:
+        lines.append("📭 No synced emails in this window")
+        lines.append("=" * 80)
+        write_frame(lines)
+        return
+    
+    lines += ["", "TOP SENDERS", "-" * 80, f"{'#':<3} {'SENDER':<50} {'EMAILS':>10} {'SIZE':>12}"]
+    for i, (sender, count, size) in enumerate(report['top_senders'], 1):
+        lines.append(f"{i:<3} {fit(sender or '(unknown)', 50)} {count:>10} {format_bytes(size):>12}")
+    
+    lines += ["", f"VOLUME PER {report['period'].upper()}", "-" * 80, f"{'PERIOD':<14} {'EMAILS':>10} {'SIZE':>12}"]
+    for start, count, size in report['volume']:
+        if report['period'] == 'month':
+            period_label = start.strftime('%b %Y')
+        else:
+            period_label = start.strftime('%d-%b-%Y')
+        lines.append(f"{period_label:<14} {count:>10} {format_bytes(size):>12}")
+    lines.append("=" * 80)
+    
+    page(lines)
+
+def display_size_report(emails, title):
+    """Display emails with their size and attachment list, e.g. attachment search or largest messages"""
+    if not emails:
+        print("📭 No emails to display")
+        return
+    
+    columns = f"{'#':<3} {'UID':<8} {'SIZE':>10} {'FROM':<30} {'SUBJECT':<50} {'DATE':<25}"
+    header = ["", title, "=" * 130, columns, "-" * 130]
+    
+    rows = []
+    for i, email in enumerate(emails, 1):
+        size = format_bytes(email['message_size']) if email.get('message_size') is not None else '?'
+        from_addr = fit(email['from'], MAX_FROM_LENGTH)
+        subject = fit(email['subject'], MAX_SUBJECT_LENGTH)
+        rows.append(f"{i:<3} {email['uid']:<8} {size:>10} {from_addr} {subject} {clean(email['date'])[:25]}")
+        for filename, attachment_type, attachment_size in email.get('attachments', []):
+            rows.append(f"{'':<12} 📎 {fit(filename, 60)} {fit(attachment_type, 30)} {format_bytes(attachment_size):>10}")
+    
+    page(rows + ["=" * 130], header=header)
+
+def display_metrics(metrics):
+    """Display session counters, timings and cache hit rates"""
+    counters, timings = metrics.snapshot()
+    
+    print("\n📊 SESSION STATS")
+    print("=" * 70)
+    
+    if not counters and not timings:
+        print("No activity recorded yet")
+    
+    for name in sorted(counters):
+        print(f"{name:<40} {counters[name]:>12}")
+    
+    if timings:
+        print("-" * 70)
+        print(f"{'TIMING':<34} {'COUNT':>8} {'AVG ms':>12} {'MAX ms':>12}")
+        for name in sorted(timings):
+            count, total, longest = timings[name]
+            print(f"{name:<34} {count:>8} {total / count * 1000:>12.1f} {longest * 1000:>12.1f}")
+    
+    cache_names = sorted({name.rsplit('.', 1)[0] for name in counters if name.endswith(('.hits', '.misses'))})
+    if cache_names:
+        print("-" * 70)
+        for cache_name in cache_names:
+            rate = metrics.hit_rate(cache_name)
+            print(f"{cache_name + ' hit rate':<40} {'n/a' if rate is None else format(rate, '.0%'):>12}")
+    
+    gauges, events = metrics.recent()
+    if gauges:
+        print("-" * 70)
+        for name in sorted(gauges):
+            print(f"{name:<40} {gauges[name]:>12}")
+    if events:
+        print("-" * 70)
+        print("RECENT DECISIONS")
+        for when, name, message in events:
+            print(f"{time.strftime('%H:%M:%S', time.localtime(when))} {name:<14} {message}")
+    
+    print("=" * 70)
@@ -1,10 +1,57 @@
 from datetime import datetime, timedelta
 import calendar
-from search_utils import get_related_words, parse_date_query, sort_by_relevance
+from search_utils import get_related_words, parse_date_query, date_query_range, sort_by_relevance
+from query_cache import QueryCache
+from analytics import top_senders, volume_by_period, window_summary, largest_messages
+from metrics import metrics
 
 class EmailSearch:
     def __init__(self, gmail_client):
         self.gmail_client = gmail_client
+        self.query_cache = QueryCache()
+    
+    def _cached_search(self, key, search, search_since):
+        """Return all UIDs matching a search, reusing the cached result when the mailbox allows
+        
+        search() returns every matching UID; search_since(uid) returns the
+        matches from uid upwards and is used to check only newly arrived mail.
+        """
+        state = self.gmail_client.mailbox_status()
+        # Keep the local index consistent with the state the result is tagged with;
+        # if that fails, answer without caching so a stale result is never reused
+        current = self.gmail_client.sync(status=state)
+        
+        entry = self.query_cache.get(key)
+        if entry and entry['state']['UIDVALIDITY'] == state['UIDVALIDITY']:
+            cached = entry['state']
+            
+            if state['UIDNEXT'] == cached['UIDNEXT'] and state['MESSAGES'] == cached['MESSAGES']:
+                # Same messages. A HIGHESTMODSEQ change alone means flag updates,
+                # which none of our searches look at.
+                metrics.incr('query_cache.hits')
+                return entry['uids']
+            
+            if state['UIDNEXT'] > cached['UIDNEXT']:
+                since_uid = cached['UIDNEXT']
+                arrived = [int(uid) for uid in self.gmail_client.search_uids(f'UID {since_uid}:*')]
+                arrived = [uid for uid in arrived if uid >= since_uid]
+                
+                # Nothing expunged, so the cached matches still hold and only new mail needs checking
+                if state['MESSAGES'] == cached['MESSAGES'] + len(arrived):
+                    known = set(entry['uids'])
+                    new_uids = [int(uid) for uid in search_since(since_uid)]
+                    uids = entry['uids'] + [uid for uid in new_uids if uid >= since_uid and uid not in known]
+                    if current:
+                        self.query_cache.put(key, state, uids)
+                    metrics.incr('query_cache.hits')
+                    metrics.incr('query_cache.delta_updates')
+                    return uids
+        
+        metrics.incr('query_cache.misses')
+        uids = [int(uid) for uid in search()]
+        if current:
+            self.query_cache.put(key, state, uids)
+        return uids
     
     def search_emails_by_date(self, date_query, limit=50):
         """Enhanced date search with month/year range support"""
@@ -18,80 +65,87 @@ class EmailSearch:
             return []
         
         try:
+            first_day, last_day = date_query_range(parsed_date, date_type)
+            first_day_str = first_day.strftime("%d-%b-%Y")
+            last_day_str = last_day.strftime("%d-%b-%Y")
+            
             if date_type == "single_date":
                 print(f"🔍 Searching for emails on: {parsed_date}")
-                result, data = self.gmail_client.imap.search(None, f'(ON "{parsed_date}")')
-                
             elif date_type == "month_range":
                 month, year = parsed_date
-                # Get first and last day of the month
-                first_day = datetime(year, month, 1)
-                last_day = datetime(year, month, calendar.monthrange(year, month)[1])
-                
-                first_day_str = first_day.strftime("%d-%b-%Y")
-                last_day_str = last_day.strftime("%d-%b-%Y")
-                
                 print(f"🔍 Searching for emails in {calendar.month_name[month]} {year} ({first_day_str} to {last_day_str})")
-                result, data = self.gmail_client.imap.search(None, f'(SINCE "{first_day_str}" BEFORE "{(last_day + timedelta(days=1)).strftime("%d-%b-%Y")}")')
-                
             elif date_type == "year_range":
-                year = parsed_date
-                first_day = datetime(year, 1, 1)
-                last_day = datetime(year, 12, 31)
-                
-                first_day_str = first_day.strftime("%d-%b-%Y")
-                last_day_str = last_day.strftime("%d-%b-%Y")
-                
-                print(f"🔍 Searching for emails in {year} ({first_day_str} to {last_day_str})")
-                result, data = self.gmail_client.imap.search(None, f'(SINCE "{first_day_str}" BEFORE "{(last_day + timedelta(days=1)).strftime("%d-%b-%Y")}")')
+                print(f"🔍 Searching for emails in {parsed_date} ({first_day_str} to {last_day_str})")
             
-            if result == 'OK' and data[0]:
-                email_numbers = data[0].split()
-                
-                # Sort by most recent first (newest to oldest)
-                email_numbers = sorted(email_numbers, key=int, reverse=True)
-                
-                if limit and len(email_numbers) > limit:
-                    email_numbers = email_numbers[:limit]
-                    print(f"📧 Found {len(data[0].split())} emails, showing first {limit}")
-                else:
-                    print(f"📧 Found {len(email_numbers)} emails")
-                
-                return self.gmail_client.fetch_email_list(email_numbers)
-            else:
-                print(f"❌ No emails found for the specified date range")
-                return []
+            return self._fetch_date_range(first_day, last_day, limit)
                 
         except Exception as e:
             print(f"❌ Date search error: {str(e)}")
             return []
     
+    def _fetch_date_range(self, first_day, last_day, limit):
+        """Resolve a date range through the local index and fetch the newest headers"""
+        key = ('date', first_day.toordinal(), last_day.toordinal(), limit)
+        email_numbers = self._cached_search(
+            key,
+            lambda: self.gmail_client.search_uids_by_date(first_day, last_day),
+            lambda since_uid: [uid for uid in self.gmail_client.search_uids_by_date(first_day, last_day) if uid >= since_uid]
+        )
+        
+        if not email_numbers:
+            print(f"❌ No emails found for the specified date range")
+            return []
+        
+        # Sort by most recent first (newest to oldest)
+        email_numbers = sorted(email_numbers, reverse=True)
+        total = len(email_numbers)
+        
+        if limit and total > limit:
+            email_numbers = email_numbers[:limit]
+            print(f"📧 Found {total} emails, showing first {limit}")
+        else:
+            print(f"📧 Found {total} emails")
+        
+        return self.gmail_client.fetch_email_list(email_numbers)
+    
+    @staticmethod
+    def build_text_criteria(related_words, fields=("BODY", "SUBJECT")):
+        """OR together a field match for every related word into one IMAP search key"""
+        conditions = []
+        for word in related_words:
+            matches = [f'({field} "{word}")' for field in fields]
+            condition = matches[0]
+            for match in matches[1:]:
+                condition = f'(OR {condition} {match})'
+            conditions.append(condition)
+        
+        search_query = conditions[0]
+        for condition in conditions[1:]:
+            search_query = f'(OR {search_query} {condition})'
+        return search_query
+    
     def search_emails_by_query(self, query, limit=50, sort_by="date"):
         """Search emails by query with improved sorting options"""
         related_words = get_related_words(query)
         print(f"🔍 Search terms: {related_words}")
         
         # Build IMAP search query
-        if len(related_words) == 1:
-            search_query = f'(OR (BODY "{related_words[0]}") (SUBJECT "{related_words[0]}"))'
-        else:
-            conditions = []
-            for word in related_words:
-                conditions.append(f'(OR (BODY "{word}") (SUBJECT "{word}"))')
-            
-            search_query = conditions[0]
-            for condition in conditions[1:]:
-                search_query = f'(OR {search_query} {condition})'
+        search_query = self.build_text_criteria(related_words)
         
         try:
-            result, data = self.gmail_client.imap.search(None, search_query)
+            key = ('query', tuple(related_words), sort_by, limit)
+            email_numbers = self._cached_search(
+                key,
+                lambda: self.gmail_client.search_uids(search_query),
+                lambda since_uid: self.gmail_client.search_uids(f'(UID {since_uid}:* {search_query})')
+            )
             
-            if result == 'OK' and data[0]:
-                email_numbers = data[0].split()
+            if email_numbers:
+                total = len(email_numbers)
                 
-                if limit and len(email_numbers) > limit:
+                if limit and total > limit:
                     email_numbers = email_numbers[:limit]
-                    print(f"📧 Found {len(data[0].split())} emails, showing first {limit}")
+                    print(f"📧 Found {total} emails, showing first {limit}")
                 else:
                     print(f"📧 Found {len(email_numbers)} emails")
                 
@@ -117,12 +171,121 @@ class EmailSearch:
                 return emails
             else:
                 print("❌ No emails found for the search query")
-                return []
+                # Fall back to typo-tolerant matching on subjects and senders
+                return self.search_emails_by_text(query, limit)
                 
         except Exception as e:
             print(f"❌ Search error: {str(e)}")
             return []
     
+    def search_emails_by_text(self, query, limit=50):
+        """Typo-tolerant subject/sender search answered from the local trigram index"""
+        self.gmail_client.sync()
+        matches = self.gmail_client.text_index.search(query, limit)
+        
+        if not matches:
+            print(f"❌ No subjects or senders resemble '{query}'")
+            return []
+        
+        if len(matches) >= limit:
+            # The index stops looking once it has the best `limit` matches
+            print(f"📧 Showing the best {limit} subject/sender matches for '{query}'")
+        else:
+            print(f"📧 Found {len(matches)} subject/sender matches for '{query}'")
+        
+        emails = self.gmail_client.fetch_email_list([uid for uid, _ in matches])
+        scores = {str(uid): score for uid, score in matches}
+        for email in emails:
+            # Similarity as a percentage, 100 for exact substring matches
+            email['relevance_score'] = round(scores.get(email['uid'], 0) * 100)
+        return emails
+    
+    def analyze_mailbox(self, date_query="", top_n=10, period="month"):
+        """Top senders and message volume for a time window, computed from the local index"""
+        index = self.gmail_client.date_index
+        
+        if date_query:
+            parsed_date, date_type = parse_date_query(date_query)
+            if not parsed_date:
+                print(f"❌ Could not parse date: '{date_query}'")
+                print("💡 Try formats like: 'march 2025', '2024', 'july', 'yesterday', '7 july 2025'")
+                return None
+            first_day, last_day = date_query_range(parsed_date, date_type)
+            start_day, end_day = first_day.toordinal(), last_day.toordinal()
+            label = f"{first_day.strftime('%d-%b-%Y')} to {last_day.strftime('%d-%b-%Y')}"
+        else:
+            start_day, end_day = datetime.min.toordinal(), datetime.max.toordinal()
+            label = "all synced mail"
+        
+        self.gmail_client.sync()
+        if index.uncovered(start_day, end_day):
+            print("⚠️ Part of this window is older than the synced history and is not counted")
+        
+        with metrics.timer('analytics'):
+            messages, total_bytes = window_summary(index, start_day, end_day)
+            report = {
+                'label': label,
+                'period': period,
+                'messages': messages,
+                'bytes': total_bytes,
+                'top_senders': top_senders(index, start_day, end_day, top_n),
+                'volume': volume_by_period(index, start_day, end_day, period)
+            }
+        return report
+    
+    def search_attachments(self, name=None, mime_type=None, min_size=None, max_size=None, limit=50):
+        """Messages with attachments matching name, type and size, answered from the local attachment index"""
+        self.gmail_client.sync()
+        with metrics.timer('attachments.search'):
+            matches = self.gmail_client.attachment_index.search(name, mime_type, min_size, max_size)
+        
+        if not matches:
+            print("❌ No synced attachments match these filters")
+            return []
+        
+        attachments = {}
+        for uid, filename, attachment_type, size in matches:
+            attachments.setdefault(uid, []).append((filename, attachment_type, size))
+        
+        uids = list(attachments)
+        if len(uids) > limit:
+            print(f"📎 Found {len(matches)} attachments in {len(uids)} emails, showing first {limit} emails")
+        else:
+            print(f"📎 Found {len(matches)} attachments in {len(uids)} emails")
+        
+        emails = self.gmail_client.fetch_email_list(uids[:limit])
+        for email in emails:
+            email['attachments'] = attachments.get(int(email['uid']), [])
+        return emails
+    
+    def find_largest_emails(self, date_query="", limit=20):
+        """Largest messages in a time window, ranked from the size column of the local index"""
+        index = self.gmail_client.date_index
+        start_day, end_day = datetime.min.toordinal(), datetime.max.toordinal()
+        if date_query:
+            parsed_date, date_type = parse_date_query(date_query)
+            if not parsed_date:
+                print(f"❌ Could not parse date: '{date_query}'")
+                return []
+            first_day, last_day = date_query_range(parsed_date, date_type)
+            start_day, end_day = first_day.toordinal(), last_day.toordinal()
+        
+        self.gmail_client.sync()
+        if index.uncovered(start_day, end_day):
+            print("⚠️ Part of this window is older than the synced history and is not ranked")
+        
+        with metrics.timer('analytics.largest'):
+            largest = largest_messages(index, start_day, end_day, limit)
+        if not largest:
+            print("📭 No synced emails in this window")
+            return []
+        
+        emails = self.gmail_client.fetch_email_list([uid for uid, _, _, _ in largest])
+        attachments = self.gmail_client.attachment_index.attachments_of(uid for uid, _, _, _ in largest)
+        for email in emails:
+            email['attachments'] = attachments.get(int(email['uid']), [])
+        return emails
+    
     def smart_sort_emails(self, emails, related_words):
         """Smart sorting: relevance → date → alphabetical → numerical"""
         import re
@@ -173,30 +336,51 @@ class EmailSearch:
             
             print(f"🔍 Searching for emails from {start_date_str} to {end_date_str}")
             
-            # Add one day to end_date for BEFORE search (IMAP BEFORE is exclusive)
-            end_date_plus_one = end_date + timedelta(days=1)
-            end_date_plus_one_str = end_date_plus_one.strftime("%d-%b-%Y")
+            return self._fetch_date_range(start_date, end_date, limit)
+                
+        except Exception as e:
+            print(f"❌ Date range search error: {str(e)}")
+            return []
+    
+    def search_emails_by_date_range_and_query(self, start_date, end_date, query, limit=50):
+        """Search a date range for a query in one server SEARCH, fetching only matching headers"""
+        related_words = get_related_words(query)
+        print(f"🔍 Search terms: {related_words}")
+        
+        try:
+            start_date_str = start_date.strftime("%d-%b-%Y")
+            end_date_str = end_date.strftime("%d-%b-%Y")
+            # IMAP BEFORE is exclusive
+            end_date_plus_one_str = (end_date + timedelta(days=1)).strftime("%d-%b-%Y")
             
-            result, data = self.gmail_client.imap.search(None, 
-                f'(SINCE "{start_date_str}" BEFORE "{end_date_plus_one_str}")')
+            print(f"🔍 Searching for '{query}' in emails from {start_date_str} to {end_date_str}")
             
-            if result == 'OK' and data[0]:
-                email_numbers = data[0].split()
-                
-                # Sort by most recent first (newest to oldest)
-                email_numbers = sorted(email_numbers, key=int, reverse=True)
-                
-                if limit and len(email_numbers) > limit:
-                    email_numbers = email_numbers[:limit]
-                    print(f"📧 Found {len(data[0].split())} emails, showing first {limit}")
-                else:
-                    print(f"📧 Found {len(email_numbers)} emails")
-                
-                return self.gmail_client.fetch_email_list(email_numbers)
-            else:
-                print(f"❌ No emails found for the specified date range")
+            text_criteria = self.build_text_criteria(related_words, fields=("BODY", "SUBJECT", "FROM"))
+            search_query = f'(SINCE "{start_date_str}" BEFORE "{end_date_plus_one_str}" {text_criteria})'
+            
+            key = ('date_query', tuple(related_words), start_date.toordinal(), end_date.toordinal(), limit)
+            email_numbers = self._cached_search(
+                key,
+                lambda: self.gmail_client.search_uids(search_query),
+                lambda since_uid: self.gmail_client.search_uids(f'(UID {since_uid}:* {search_query})')
+            )
+            
+            if not email_numbers:
+                print(f"❌ No emails found matching '{query}' in the specified date range")
                 return []
-                
+            
+            # Sort by most recent first (newest to oldest)
+            email_numbers = sorted(email_numbers, reverse=True)
+            total = len(email_numbers)
+            
+            if limit and total > limit:
+                email_numbers = email_numbers[:limit]
+                print(f"📧 Found {total} emails matching '{query}', showing first {limit}")
+            else:
+                print(f"📧 Found {total} emails matching '{query}'")
+            
+            return self.gmail_client.fetch_email_list(email_numbers)
+            
         except Exception as e:
             print(f"❌ Date range search error: {str(e)}")
             return []
@@ -0,0 +1,260 @@
+import imaplib
+import re
+import threading
+import time
+from collections import deque
+from queue import Queue
+from config import (SYNC_BATCH_SIZE, FETCH_TARGET_LATENCY, FETCH_MIN_CHUNK, FETCH_MAX_CHUNK,
+                    FETCH_MAX_IN_FLIGHT, FETCH_BACKOFF, FETCH_BACKOFF_MAX, FETCH_MAX_RETRIES)
+from metrics import metrics
+
+# Gmail's answers when an account has too many connections or exceeded its bandwidth
+THROTTLE_RE = re.compile(r'too many simultaneous connections|throttl|bandwidth|exceeded', re.IGNORECASE)
+
+class Throttled(imaplib.IMAP4.error):
+    """A NO response telling us to slow down"""
+
+def uid_set(uids):
+    """Compress UIDs into an IMAP sequence set, e.g. [1, 2, 3, 7] -> '1:3,7'"""
+    uids = sorted(int(uid) for uid in uids)
+    ranges = []
+    start = prev = None
+    for uid in uids:
+        if prev is not None and uid == prev + 1:
+            prev = uid
+            continue
+        if start is not None:
+            ranges.append(f"{start}:{prev}" if prev != start else str(start))
+        start = prev = uid
+    if start is not None:
+        ranges.append(f"{start}:{prev}" if prev != start else str(start))
+    return ','.join(ranges)
+
+def response_bytes(msg_data):
+    """Bytes in a FETCH response as returned by imaplib"""
+    total = 0
+    for item in msg_data or ():
+        if isinstance(item, tuple):
+            total += sum(len(part) for part in item if part)
+        elif item:
+            total += len(item)
+    return total
+
+class AimdController:
+    """Chunk size and in-flight request count, tuned from per-batch measurements
+
+    The chunk size doubles while batches finish under FETCH_TARGET_LATENCY
+    (slow start), then grows by FETCH_MIN_CHUNK per batch; a slow batch halves
+    it. The number of parallel requests climbs by one per round of batches
+    as long as throughput keeps improving by 10%, and steps back when it
+    drops. A throttle response halves both and caps in-flight requests below
+    the level that was throttled for the rest of the session.
+    """
+
+    def __init__(self, chunk=SYNC_BATCH_SIZE, target_latency=FETCH_TARGET_LATENCY,
+                 min_chunk=FETCH_MIN_CHUNK, max_chunk=FETCH_MAX_CHUNK, max_in_flight=FETCH_MAX_IN_FLIGHT):
+        self.chunk = chunk
+        self.in_flight = 1
+        self.ceiling = max_in_flight
+        self.target_latency = target_latency
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.slow_start = True
+        self.throttle_streak = 0
+        self.round_bytes = 0
+        self.round_batches = 0
+        self.round_start = None
+        self.last_rate = 0
+
+    def start_round(self):
+        self.round_bytes = 0
+        self.round_batches = 0
+        self.round_start = time.perf_counter()
+
+    def batch_done(self, latency, size, count, requested):
+        """Adjust after a batch of count of the requested messages fetched in latency seconds returning size bytes"""
+        self.throttle_streak = 0
+        chunk, in_flight = self.chunk, self.in_flight
+        # A batch cut short by the end of the UIDs says nothing about larger chunks or more parallelism
+        full = count >= requested
+
+        if latency > self.target_latency:
+            self.chunk = max(self.min_chunk, self.chunk // 2)
+            self.slow_start = False
+        elif full and self.slow_start:
+            self.chunk = min(self.max_chunk, self.chunk * 2)
+        elif full:
+            self.chunk = min(self.max_chunk, self.chunk + self.min_chunk)
+
+        # Judge concurrency on throughput over a round of in_flight full batches
+        if full:
+            self.round_bytes += size
+            self.round_batches += 1
+        if full and self.round_batches >= self.in_flight:
+            rate = self.round_bytes / max(time.perf_counter() - self.round_start, 1e-6)
+            if rate > self.last_rate * 1.1 and latency <= self.target_latency:
+                self.in_flight = min(self.ceiling, self.in_flight + 1)
+            elif rate < self.last_rate * 0.9:
+                self.in_flight = max(1, self.in_flight - 1)
+            self.last_rate = rate
+            self.start_round()
+
+        reason = f"batch {latency:.2f}s, {size / max(latency, 1e-6) / 1024:.0f} KB/s"
+        self._report(chunk, in_flight, reason)
+
+    def throttled(self, message):
+        """Back off after a throttle response; returns the seconds to wait before retrying"""
+        chunk, in_flight = self.chunk, self.in_flight
+        self.ceiling = max(1, min(self.ceiling, self.in_flight - 1))
+        self.chunk = max(self.min_chunk, self.chunk // 2)
+        self.in_flight = max(1, min(self.ceiling, self.in_flight // 2))
+        self.slow_start = False
+        self.last_rate = 0
+        self.throttle_streak += 1
+        metrics.incr('fetch.throttled')
+        self._report(chunk, in_flight, f"throttled: {message}")
+        return min(FETCH_BACKOFF_MAX, FETCH_BACKOFF * 2 ** (self.throttle_streak - 1))
+
+    def _report(self, chunk, in_flight, reason):
+        metrics.gauge('fetch.chunk_size', self.chunk)
+        metrics.gauge('fetch.in_flight', self.in_flight)
+        # Additive steps happen on nearly every batch, only list the bigger moves
+        additive_step = in_flight == self.in_flight and self.chunk == chunk + self.min_chunk
+        if (chunk, in_flight) != (self.chunk, self.in_flight) and not additive_step:
+            metrics.event('fetch.tuning', f"chunk {chunk}→{self.chunk}, in-flight {in_flight}→{self.in_flight} ({reason})")
+
+class FetchScheduler:
+    """Runs batched UID FETCHes with the chunk size and parallelism chosen by an AimdController
+
+    Extra requests run on additional read-only connections opened on demand
+    and closed when the fetch completes; the controller's settings carry over
+    to the next fetch. Batches are yielded in the order of the UIDs given.
+    A failed batch, or throttling that outlasts FETCH_MAX_RETRIES backoffs,
+    ends the fetch with an IMAP4.error once the requests in flight are done.
+    """
+
+    def __init__(self, gmail_client, controller=None):
+        self.gmail_client = gmail_client
+        self.controller = controller or AimdController()
+
+    def fetch(self, uids, items, timer='fetch.batch'):
+        """Yield (batch uids, msg_data) per fetched batch, raising IMAP4.error if a batch fails"""
+        controller = self.controller
+        queue = deque(enumerate(uids))   # (position, uid), positions keep the output order
+        done = Queue()
+        idle = [self.gmail_client.imap]
+        extra = []
+        finished = {}                    # first position -> (batch, msg_data)
+        next_position = 0
+        running = 0
+        resume_at = 0
+        failure = None
+
+        def run(connection, batch, requested):
+            start = time.perf_counter()
+            try:
+                res, msg_data = connection.uid('FETCH', uid_set(uid for _, uid in batch), items)
+                if res != 'OK':
+                    message = msg_data[0] if msg_data and msg_data[0] else res
+                    message = message.decode(errors='replace') if isinstance(message, bytes) else str(message)
+                    if THROTTLE_RE.search(message):
+                        raise Throttled(message)
+                    raise imaplib.IMAP4.error(message)
+                done.put((connection, batch, requested, msg_data, time.perf_counter() - start, None))
+            except Exception as e:
+                done.put((connection, batch, requested, None, time.perf_counter() - start, e))
+
+        controller.start_round()
+        try:
+            while queue or running:
+                while queue and running < controller.in_flight and time.monotonic() >= resume_at:
+                    try:
+                        connection = idle.pop() if idle else self._open_extra(extra)
+                    except Throttled as e:
+                        # Gmail refused the login: back off like after a throttled FETCH
+                        resume_at = time.monotonic() + controller.throttled(str(e))
+                        break
+                    if connection is None:
+                        break
+                    batch = [queue.popleft() for _ in range(min(controller.chunk, len(queue)))]
+                    threading.Thread(target=run, args=(connection, batch, controller.chunk),
+                                     name="imap-fetch", daemon=True).start()
+                    running += 1
+
+                if not running:
+                    # Backing off with nothing in flight
+                    time.sleep(max(0, resume_at - time.monotonic()))
+                    continue
+
+                connection, batch, requested, msg_data, latency, error = done.get()
+                running -= 1
+                idle.append(connection)
+                metrics.observe(timer, latency)
+
+                if isinstance(error, Throttled) or (error and THROTTLE_RE.search(str(error))):
+                    backoff = controller.throttled(str(error))
+                    if controller.throttle_streak > FETCH_MAX_RETRIES:
+                        error = Throttled(f"still throttled after {FETCH_MAX_RETRIES} retries: {error}")
+                    else:
+                        queue = deque(sorted(batch + list(queue)))
+                        resume_at = time.monotonic() + backoff
+                        self._close_surplus(idle, extra)
+                        continue
+                if error:
+                    # Let the other requests finish, then report the batch as missing
+                    metrics.incr('fetch.failed_batches')
+                    failure = failure or error
+                    queue.clear()
+                    continue
+                size = response_bytes(msg_data)
+                metrics.incr('fetch.bytes', size)
+                controller.batch_done(latency, size, len(batch), requested)
+
+                finished[batch[0][0]] = (batch, msg_data)
+                while next_position in finished:
+                    batch, msg_data = finished.pop(next_position)
+                    next_position += len(batch)
+                    yield [uid for _, uid in batch], msg_data
+        finally:
+            # Stopped early by the consumer: wait for requests still running on
+            # these connections before logging them out
+            for _ in range(running):
+                done.get()
+            for connection in extra:
+                self._close(connection)
+        if failure:
+            raise failure if isinstance(failure, imaplib.IMAP4.error) else imaplib.IMAP4.error(str(failure))
+
+    def _close(self, connection):
+        try:
+            connection.logout()
+        except Exception:
+            pass
+
+    def _close_surplus(self, idle, extra):
+        """Log out idle extra connections beyond the allowed in-flight requests"""
+        for connection in [c for c in idle if c in extra]:
+            if len(extra) < self.controller.in_flight:
+                break
+            idle.remove(connection)
+            extra.remove(connection)
+            self._close(connection)
+
+    def _open_extra(self, extra):
+        """Open another connection for a parallel request
+        
+        Returns None if Gmail refuses the connection, and raises Throttled
+        if the refusal asks us to slow down.
+        """
+        try:
+            connection = self.gmail_client.open_connection(readonly=True)
+        except Exception as e:
+            if THROTTLE_RE.search(str(e)):
+                raise Throttled(str(e))
+            else:
+                self.controller.ceiling = max(1, len(extra) + 1)
+                self.controller.in_flight = min(self.controller.in_flight, self.controller.ceiling)
+            return None
+        extra.append(connection)
+        metrics.incr('fetch.connections_opened')
+        return connection
@@ -1,45 +1,160 @@
 import imaplib
 import email
 import re
-from nltk.corpus import wordnet
-import nltk
-from datetime import datetime, timedelta
-import dateutil.parser
+from datetime import date, timedelta
 from collections import defaultdict
 import calendar
-from config import IMAP_SERVER
+import os
+import pickle
+import time
+from config import (IMAP_SERVER, CACHE_DIR, SYNC_BATCH_SIZE, SYNC_INTERVAL, DATE_INDEX_SYNC_DAYS,
+                    SYNC_CHECKPOINT, SYNC_MAX_ATTEMPTS)
+from date_index import DateIndex, UID_RE
+from trigram_index import TrigramIndex
+from attachment_index import AttachmentIndex
+from header_parser import decode_header_value, parse_header_batch, parse_sync_batch
+from parse_pool import ParseStage
+from fetch_scheduler import FetchScheduler
+import parse_pool
+from metrics import metrics
+from imap_session import ImapSession
+from terminal import Progress
 
-try:
-    nltk.download('wordnet', quiet=True)
-    nltk.download('omw-1.4', quiet=True)
-except:
-    pass
+RFC822_SIZE_RE = re.compile(rb'RFC822\.SIZE (\d+)')
+
+# Bump when the persisted sync state gains or changes fields
+SYNC_STATE_VERSION = 7
+
+# Rewrite the trigram snapshot once its journal holds this share of its documents
+TEXT_JOURNAL_RATIO = 0.1
+
+def fetch_literals(msg_data):
+    """Yield (uid, metadata, literal) triples from a UID FETCH response
+    
+    The metadata joins the text around the literal, since servers may send
+    UID and other items after it.
+    """
+    for i, item in enumerate(msg_data):
+        if not isinstance(item, tuple):
+            continue
+        metadata = item[0]
+        if i + 1 < len(msg_data) and isinstance(msg_data[i + 1], bytes):
+            metadata += msg_data[i + 1]
+        match = UID_RE.search(metadata)
+        if match:
+            yield int(match.group(1)), metadata, item[1]
+
+def parse_email_message(uid, raw_email):
+    """Parse a full RFC822 message into the dict shown by the brief view"""
+    msg = email.message_from_bytes(raw_email)
+    
+    # Extract body
+    body = ""
+    html_body = ""
+    
+    if msg.is_multipart():
+        for part in msg.walk():
+            content_type = part.get_content_type()
+            content_disposition = str(part.get("Content-Disposition"))
+    
+            if "attachment" in content_disposition:
+                continue
+    
+            if content_type == "text/plain":
+                try:
+                    body = part.get_payload(decode=True).decode('utf-8')
+                except:
+                    try:
+                        body = part.get_payload(decode=True).decode('latin-1')
+                    except:
+                        body = str(part.get_payload())
+            elif content_type == "text/html":
+                try:
+                    html_body = part.get_payload(decode=True).decode('utf-8')
+                except:
+                    try:
+                        html_body = part.get_payload(decode=True).decode('latin-1')
+                    except:
+                        html_body = str(part.get_payload())
+    else:
+        try:
+            body = msg.get_payload(decode=True).decode('utf-8')
+        except:
+            try:
+                body = msg.get_payload(decode=True).decode('latin-1')
+            except:
+                body = str(msg.get_payload())
+    
+    if not body and html_body:
+        body = re.sub(r'<[^>]+>', '', html_body)
+    
+    return {
+        'uid': uid,
+        'from': decode_header_value(msg.get("from", "Unknown Sender")),
+        'subject': decode_header_value(msg.get("subject", "No Subject")),
+        'date': msg.get("date", "Unknown Date"),
+        'body': body.strip()
+    }
 
 class GmailClient:
     def __init__(self, email_address, password):
         self.email_address = email_address
         self.password = password
         self.imap = None
+        self.mailbox = "inbox"
         self.email_cache = {}
         
+        # Local sync state, persisted per mailbox
+        self.date_index = DateIndex()
+        self.text_index = TrigramIndex()
+        self.attachment_index = AttachmentIndex()
+        self.uidvalidity = None
+        self.synced_uid = 0
+        self.synced_messages = 0
+        self.sync_failures = {}     # uid -> syncs that got no record for it
+        self.index_current = False  # the last sync indexed everything up to the mailbox's UIDNEXT
+        
+        # The trigram index is saved as a snapshot plus a journal of documents added since
+        self.text_snapshot_docs = 0
+        self.text_saved_docs = 0
+        self.text_index_dirty = True  # expunges and resets need a new snapshot
+        self.last_sync = 0
+        
+        # Adapts FETCH batch size and parallelism to the mailbox and connection
+        self.fetch_scheduler = FetchScheduler(self)
+        
+        # Optional background body prefetcher (see prefetcher.py)
+        self.prefetcher = None
+        
     def connect(self):
         """Connect to Gmail IMAP server"""
         try:
-            self.imap = imaplib.IMAP4_SSL(IMAP_SERVER)
-            result, login_data = self.imap.login(self.email_address, self.password)
+            self.imap = ImapSession(IMAP_SERVER, self.email_address, self.password, self.mailbox)
+            result, login_data = self.imap.open()
             if result != 'OK':
                 print("❌ Login failed!")
                 return False
             else:
                 print("✅ Connected to Gmail successfully!")
-                self.imap.select("inbox")
+                self.load_sync_state()
+                self.sync(force=True)
                 return True
         except Exception as e:
             print(f"❌ Connection error: {str(e)}")
             return False
     
+    def open_connection(self, readonly=False):
+        """Open an additional authenticated connection on the selected mailbox"""
+        imap = ImapSession(IMAP_SERVER, self.email_address, self.password, self.mailbox,
+                           readonly=readonly, keepalive=False)
+        imap.open()
+        return imap
+    
     def disconnect(self):
         """Disconnect from Gmail"""
+        if self.prefetcher:
+            self.prefetcher.stop()
+        parse_pool.shutdown()
         if self.imap:
             try:
                 self.imap.logout()
@@ -47,114 +162,380 @@ class GmailClient:
             except:
                 pass
     
+    def _state_path(self, suffix=".pickle"):
+        account = re.sub(r'[^\w.@-]', '_', self.email_address)
+        return os.path.join(CACHE_DIR, account, f"{self.mailbox}{suffix}")
+    
+    def load_sync_state(self):
+        """Load the persisted index for the selected mailbox, if any"""
+        try:
+            with open(self._state_path(), 'rb') as f:
+                state = pickle.load(f)
+            if state.get('version') != SYNC_STATE_VERSION:
+                # Written by an older release, resync from scratch
+                return
+            text_index = self._load_text_index(state['uidvalidity'])
+            if text_index is None:
+                return
+            self.uidvalidity = state['uidvalidity']
+            self.synced_uid = state['synced_uid']
+            self.synced_messages = state['synced_messages']
+            self.sync_failures = state['sync_failures']
+            self.date_index = state['date_index']
+            self.text_index = text_index
+            self.attachment_index = state['attachment_index']
+        except Exception:
+            pass
+    
+    def _load_text_index(self, uidvalidity):
+        """The trigram index snapshot with the journal replayed on top, None if unusable"""
+        try:
+            with open(self._state_path(".text.pickle"), 'rb') as f:
+                snapshot = pickle.load(f)
+        except Exception:
+            return None
+        if snapshot.get('uidvalidity') != uidvalidity:
+            return None
+        text_index = snapshot['text_index']
+        self.text_snapshot_docs = len(text_index.uids)
+        self.text_index_dirty = False
+        try:
+            with open(self._state_path(".text.log"), 'rb') as f:
+                while True:
+                    first_doc, entries = pickle.load(f)
+                    if first_doc != len(text_index.uids):
+                        # Left over from before the snapshot
+                        self.text_index_dirty = True
+                        break
+                    for uid, text in entries:
+                        text_index.add_text(uid, text)
+        except EOFError:
+            pass
+        except Exception:
+            # A frame cut short by a crash, start a fresh snapshot next save
+            self.text_index_dirty = True
+        self.text_saved_docs = len(text_index.uids)
+        return text_index
+    
+    def save_sync_state(self, checkpoint=False):
+        """Persist the index so the next session only syncs the delta
+        
+        Checkpoints during a sync only journal the trigram index, the
+        snapshot is rewritten at most once per sync.
+        """
+        state = {
+            'version': SYNC_STATE_VERSION,
+            'uidvalidity': self.uidvalidity,
+            'synced_uid': self.synced_uid,
+            'synced_messages': self.synced_messages,
+            'sync_failures': self.sync_failures,
+            'date_index': self.date_index,
+            'attachment_index': self.attachment_index
+        }
+        path = self._state_path()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Trigrams first: if we stop in between, the older state below makes the next sync fetch them again
+            self._save_text_index(snapshot=not checkpoint)
+            with open(path + ".tmp", 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(path + ".tmp", path)
+        except Exception as e:
+            print(f"⚠️ Could not save local index: {str(e)}")
+    
+    def _save_text_index(self, snapshot=True):
+        """Append new trigram documents to the journal, rewriting the snapshot once it lags too far
+        
+        The trigram index is by far the largest part of the state, so most
+        syncs only append the messages they added.
+        """
+        text_index = self.text_index
+        docs = len(text_index.uids)
+        journal_path = self._state_path(".text.log")
+        lagging = docs - self.text_snapshot_docs > self.text_snapshot_docs * TEXT_JOURNAL_RATIO
+        if self.text_index_dirty or (snapshot and lagging):
+            path = self._state_path(".text.pickle")
+            with open(path + ".tmp", 'wb') as f:
+                pickle.dump({'uidvalidity': self.uidvalidity, 'text_index': text_index}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(path + ".tmp", path)
+            open(journal_path, 'wb').close()
+            self.text_snapshot_docs = docs
+            self.text_index_dirty = False
+        elif docs > self.text_saved_docs:
+            with open(journal_path, 'ab') as f:
+                pickle.dump((self.text_saved_docs, text_index.entries(self.text_saved_docs)), f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+        self.text_saved_docs = docs
+    
+    def mailbox_status(self):
+        """Return MESSAGES, UIDNEXT, UIDVALIDITY (and HIGHESTMODSEQ with CONDSTORE) of the selected mailbox"""
+        items = 'MESSAGES UIDNEXT UIDVALIDITY'
+        if 'CONDSTORE' in self.imap.capabilities:
+            items += ' HIGHESTMODSEQ'
+        result, data = self.imap.status(self.mailbox, f'({items})')
+        if result != 'OK':
+            raise imaplib.IMAP4.error(f"STATUS failed: {data}")
+        return {key.decode(): int(value) for key, value in re.findall(rb'(\w+) (\d+)', data[0])}
+    
+    def search_uids(self, criteria):
+        """Run a UID SEARCH and return the matching UIDs"""
+        result, data = self.imap.uid('SEARCH', None, criteria)
+        if result == 'OK' and data[0]:
+            return data[0].split()
+        return []
+    
+    def _window_criteria(self):
+        if self.date_index.covered_since is None:
+            return 'ALL'
+        return f'SINCE "{date.fromordinal(self.date_index.covered_since).strftime("%d-%b-%Y")}"'
+    
+    def sync(self, force=False, status=None):
+        """Incrementally index the internal dates of new messages
+        
+        Pass a fresh mailbox_status() as status to sync against it right away.
+        Returns True when the index is current, False after a failed sync.
+        """
+        if status is None and not force and time.time() - self.last_sync < SYNC_INTERVAL:
+            return self.index_current
+        try:
+            if status is None:
+                with metrics.timer('sync.status'):
+                    status = self.mailbox_status()
+            self.last_sync = time.time()
+            
+            if status['UIDVALIDITY'] != self.uidvalidity:
+                # UIDs were reassigned, nothing indexed or cached so far is valid
+                self.email_cache.clear()
+                self.date_index.clear()
+                self.text_index.clear()
+                self.text_index_dirty = True
+                self.attachment_index.clear()
+                if DATE_INDEX_SYNC_DAYS:
+                    self.date_index.covered_since = (date.today() - timedelta(days=DATE_INDEX_SYNC_DAYS)).toordinal()
+                self.uidvalidity = status['UIDVALIDITY']
+                self.synced_uid = 0
+                self.synced_messages = 0
+                self.sync_failures = {}
+            
+            last_uid = status['UIDNEXT'] - 1
+            if last_uid <= self.synced_uid and status['MESSAGES'] == self.synced_messages:
+                self.index_current = True
+                return True
+            
+            new_uids = []
+            if last_uid > self.synced_uid:
+                criteria = self._window_criteria() if self.synced_uid == 0 else f'UID {self.synced_uid + 1}:*'
+                new_uids = sorted(int(uid) for uid in self.search_uids(criteria) if int(uid) > self.synced_uid)
+            
+            if status['MESSAGES'] < self.synced_messages + len(new_uids):
+                # Messages were expunged since the last sync
+                live_uids = [int(uid) for uid in self.search_uids(self._window_criteria())]
+                self.date_index.discard_missing(live_uids)
+                self.text_index.discard_missing(live_uids)
+                self.text_index_dirty = True
+                self.attachment_index.discard_missing(live_uids)
+            
+            # Batches arrive in UID order as they are parsed; index them up to the
+            # first UID without a record, the rest are fetched again next sync
+            position = 0   # new_uids[:position] are indexed or given up on
+            saved = 0      # position at the last checkpoint
+            error = None
+            batches = self._fetch_sync_records(new_uids)
+            try:
+                with metrics.timer('sync.fetch'):
+                    for batch, records in batches:
+                        found = {record[0] for record in records}
+                        complete = next((i for i, uid in enumerate(batch)
+                                         if uid not in found and not self._give_up(uid)), len(batch))
+                        if complete < len(batch):
+                            records = [record for record in records if record[0] < batch[complete]]
+                        self._index_sync_records(records)
+                        position += complete
+                        if complete < len(batch):
+                            error = imaplib.IMAP4.error(f"message {batch[complete]} could not be indexed")
+                            break
+                        if position - saved >= SYNC_CHECKPOINT and position < len(new_uids):
+                            # Checkpoint, so an interrupted long sync resumes from here
+                            self._advance_sync(status, new_uids, position)
+                            self.save_sync_state(checkpoint=True)
+                            saved = position
+            except imaplib.IMAP4.error as e:
+                error = e
+            finally:
+                batches.close()
+            metrics.incr('sync.messages', position)
+            
+            if position < len(new_uids):
+                self._advance_sync(status, new_uids, position)
+                self.save_sync_state()
+                raise error or imaplib.IMAP4.error(f"{len(new_uids) - position} new messages could not be fetched")
+            
+            self.synced_uid = max([self.synced_uid, last_uid] + new_uids)
+            self.synced_messages = status['MESSAGES']
+            self.save_sync_state()
+            self.index_current = True
+            return True
+        except Exception as e:
+            self.index_current = False
+            print(f"⚠️ Sync error: {str(e)}")
+            return False
+    
+    def _give_up(self, uid):
+        """Count a sync that got no record for uid; True once it should be skipped
+        
+        A message without a usable INTERNALDATE, or one expunged between
+        SEARCH and FETCH, never yields a record. Retrying it forever would
+        pin synced_uid below it and keep the index from ever being current.
+        """
+        attempts = self.sync_failures.get(uid, 0) + 1
+        if attempts < SYNC_MAX_ATTEMPTS:
+            self.sync_failures[uid] = attempts
+            return False
+        self.sync_failures.pop(uid, None)
+        metrics.incr('sync.skipped')
+        return True
+    
+    def _advance_sync(self, status, new_uids, position):
+        """Mark new_uids[:position] as synced, leaving the rest for the next sync"""
+        self.synced_uid = max(self.synced_uid, new_uids[position] - 1)
+        self.synced_messages = status['MESSAGES'] - (len(new_uids) - position)
+    
+    def _fetch_sync_records(self, uids):
+        """Fetch INTERNALDATE, size, BODYSTRUCTURE, From and Subject for uids in batches
+        
+        Yields (batch uids, records) in UID order as soon as each batch is
+        parsed, records being (uid, day, sender address, size, subject, from,
+        attachments); a message without an INTERNALDATE has none. When a
+        batch fails, the batches before it are still yielded before the
+        IMAP4.error is raised.
+        """
+        total = len(uids)
+        progress = Progress("🗂️  Indexing", total) if total > SYNC_BATCH_SIZE else None
+        stage = ParseStage(total)
+        done = 0
+        items = '(INTERNALDATE RFC822.SIZE BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS (FROM SUBJECT)])'
+        try:
+            try:
+                for batch, msg_data in self.fetch_scheduler.fetch(uids, items, timer='sync.batch'):
+                    yield from stage.submit(parse_sync_batch, msg_data, batch)
+                    done += len(batch)
+                    if progress:
+                        progress.update(done)
+            except imaplib.IMAP4.error:
+                # What arrived before the failure still gets indexed
+                yield from stage.results()
+                raise
+            yield from stage.results()
+        finally:
+            if progress:
+                progress.finish()
+    
+    def _index_sync_records(self, records):
+        """Add fetched sync records to the date, trigram and attachment indexes"""
+        entries = []
+        for uid, day, address, size, subject, sender, attachments in records:
+            entries.append((uid, day, address, size))
+            self.text_index.add(uid, subject, sender)
+            self.attachment_index.add(uid, attachments)
+        self.date_index.add_many(entries)
+    
+    def search_uids_by_date(self, start_date, end_date):
+        """UIDs with an internal date in [start_date, end_date], answered from the local index
+        
+        Only the part of the range outside the indexed window goes to the server.
+        """
+        since = start_date.toordinal()
+        until = end_date.toordinal()
+        self.sync()
+        
+        if not self.index_current:
+            # Not fully synced (yet), fall back to a plain server search
+            edge = (since, until)
+            uids = []
+        else:
+            edge = self.date_index.uncovered(since, until)
+            uids = self.date_index.range(since, until)
+        
+        if edge:
+            since_str = date.fromordinal(edge[0]).strftime("%d-%b-%Y")
+            before_str = date.fromordinal(edge[1] + 1).strftime("%d-%b-%Y")
+            uids.extend(int(uid) for uid in self.search_uids(f'(SINCE "{since_str}" BEFORE "{before_str}")'))
+        
+        return sorted(uids)
+    
     def fetch_email_list(self, email_numbers=None, limit=50):
         """Fetch email list with basic info"""
         if email_numbers is None:
             # Get emails with a default limit
-            result, data = self.imap.search(None, 'ALL')
-            if result == 'OK' and data[0]:
-                email_numbers = data[0].split()
-                # Sort by most recent first
-                email_numbers = sorted(email_numbers, key=int, reverse=True)
-                # Apply default limit of 50
-                email_numbers = email_numbers[:limit]
+            email_numbers = self.search_uids('ALL')
+            # Sort by most recent first
+            email_numbers = sorted(email_numbers, key=int, reverse=True)
+            # Apply default limit of 50
+            email_numbers = email_numbers[:limit]
         
-        emails = []
-        total = len(email_numbers)
+        uids = [num.decode() if isinstance(num, bytes) else str(num) for num in email_numbers]
         
-        print(f"📥 Fetching {total} emails...")
+        # Headers never change for a UID, only fetch the ones not cached yet
+        missing = [uid for uid in uids if uid not in self.email_cache]
+        metrics.incr('header_cache.hits', len(uids) - len(missing))
+        metrics.incr('header_cache.misses', len(missing))
+        total = len(missing)
         
-        for i, num in enumerate(email_numbers, 1):
-            print(f"\rProgress: {i}/{total}", end="", flush=True)
-            
-            try:
-                res, msg_data = self.imap.fetch(num, "(BODY[HEADER])")
-                if res == 'OK':
-                    raw_header = msg_data[0][1]
-                    msg = email.message_from_bytes(raw_header)
-                    
-                    # Parse date for proper sorting
-                    date_str = msg.get("date", "Unknown Date")
-                    parsed_date = None
-                    try:
-                        parsed_date = dateutil.parser.parse(date_str)
-                    except:
-                        parsed_date = datetime.now()
-                    
-                    # Cache basic info
-                    email_info = {
-                        'uid': num.decode() if isinstance(num, bytes) else str(num),
-                        'from': msg.get("from", "Unknown Sender"),
-                        'subject': msg.get("subject", "No Subject"),
-                        'date': msg.get("date", "Unknown Date"),
-                        'parsed_date': parsed_date,
-                        'size': len(raw_header)
-                    }
-                    
-                    emails.append(email_info)
-                    self.email_cache[email_info['uid']] = email_info
-                    
-            except Exception as e:
-                continue
+        if total:
+            print(f"📥 Fetching {total} emails...")
+        progress = Progress("Progress", total)
+        stage = ParseStage(total)
+        done = 0
+        
+        try:
+            for batch, msg_data in self.fetch_scheduler.fetch(missing, "(RFC822.SIZE BODY.PEEK[HEADER])", timer='fetch.headers'):
+                headers = []
+                for uid, metadata, raw_header in fetch_literals(msg_data):
+                    size_match = RFC822_SIZE_RE.search(metadata)
+                    headers.append((str(uid), raw_header, int(size_match.group(1)) if size_match else None))
+                
+                # Parsing overlaps the next batch's download when it runs in worker processes
+                for _, email_infos in stage.submit(parse_header_batch, headers):
+                    self._cache_headers(email_infos)
+                metrics.incr('fetch.header_count', len(headers))
+                
+                done += len(batch)
+                progress.update(done)
+        except imaplib.IMAP4.error as e:
+            print(f"\n⚠️ Some emails could not be fetched: {str(e)}")
+        
+        for _, email_infos in stage.results():
+            self._cache_headers(email_infos)
+        
+        # Keep the requested order, the server may answer in any order
+        emails = [self.email_cache[uid] for uid in uids if uid in self.email_cache]
         
-        print(f"\n✅ Fetched {len(emails)} emails")
+        if total:
+            progress.finish()
+            print(f"✅ Fetched {len(emails)} emails")
+        else:
+            print(f"✅ Loaded {len(emails)} emails from cache")
         return emails
     
+    def _cache_headers(self, email_infos):
+        """Cache basic info of parsed headers"""
+        for email_info in email_infos:
+            self.email_cache[email_info['uid']] = email_info
+            self.text_index.add(int(email_info['uid']), email_info['subject'], email_info['from'])
+    
     def fetch_email_by_uid(self, uid):
         """Fetch complete email by UID"""
+        if self.prefetcher:
+            email_data = self.prefetcher.take(uid)
+            if email_data:
+                return email_data
+        
         try:
-            res, msg_data = self.imap.fetch(uid, "(RFC822)")
+            with metrics.timer('fetch.body'):
+                res, msg_data = self.imap.uid('FETCH', uid, "(RFC822)")
             if res == 'OK':
-                raw_email = msg_data[0][1]
-                msg = email.message_from_bytes(raw_email)
-                
-                # Extract body
-                body = ""
-                html_body = ""
-                
-                if msg.is_multipart():
-                    for part in msg.walk():
-                        content_type = part.get_content_type()
-                        content_disposition = str(part.get("Content-Disposition"))
-                        
-                        if "attachment" in content_disposition:
-                            continue
-                            
-                        if content_type == "text/plain":
-                            try:
-                                body = part.get_payload(decode=True).decode('utf-8')
-                            except:
-                                try:
-                                    body = part.get_payload(decode=True).decode('latin-1')
-                                except:
-                                    body = str(part.get_payload())
-                        elif content_type == "text/html":
-                            try:
-                                html_body = part.get_payload(decode=True).decode('utf-8')
-                            except:
-                                try:
-                                    html_body = part.get_payload(decode=True).decode('latin-1')
-                                except:
-                                    html_body = str(part.get_payload())
-                else:
-                    try:
-                        body = msg.get_payload(decode=True).decode('utf-8')
-                    except:
-                        try:
-                            body = msg.get_payload(decode=True).decode('latin-1')
-                        except:
-                            body = str(msg.get_payload())
-                
-                if not body and html_body:
-                    body = re.sub(r'<[^>]+>', '', html_body)
-                
-                return {
-                    'uid': uid,
-                    'from': msg.get("from", "Unknown Sender"),
-                    'subject': msg.get("subject", "No Subject"),
-                    'date': msg.get("date", "Unknown Date"),
-                    'body': body.strip()
-                }
+                return parse_email_message(uid, msg_data[0][1])
                 
         except Exception as e:
             print(f"❌ Error fetching email {uid}: {str(e)}")
@@ -0,0 +1,80 @@
+from datetime import datetime
+from email.header import decode_header, make_header
+from email.parser import BytesHeaderParser
+from email.utils import parseaddr
+import dateutil.parser
+from attachment_index import walk_bodystructure
+from date_index import parse_internaldate_day
+from imap_parser import parse_fetch_response
+
+# Kept free of heavy imports: worker processes load this module to parse headers
+HEADER_PARSER = BytesHeaderParser()
+
+def sender_address(sender):
+    """Lowercased address part of a From value, used to group senders"""
+    address = parseaddr(sender)[1]
+    return (address or sender).strip().lower()
+
+def decode_header_value(value):
+    """Decode RFC 2047 encoded words such as =?UTF-8?Q?...?= in a header value"""
+    value = str(value)
+    if '=?' not in value:
+        return value
+    try:
+        return str(make_header(decode_header(value)))
+    except Exception:
+        return value
+
+def parse_header_block(uid, raw_header, message_size):
+    """Parse a BODY[HEADER] block into the basic info shown in email lists"""
+    msg = HEADER_PARSER.parsebytes(raw_header)
+
+    # Parse date for proper sorting
+    date_str = msg.get("date", "Unknown Date")
+    parsed_date = None
+    try:
+        parsed_date = dateutil.parser.parse(date_str)
+    except:
+        parsed_date = datetime.now()
+
+    return {
+        'uid': uid,
+        'from': decode_header_value(msg.get("from", "Unknown Sender")),
+        'subject': decode_header_value(msg.get("subject", "No Subject")),
+        'date': date_str,
+        'parsed_date': parsed_date,
+        'size': len(raw_header),
+        'message_size': message_size
+    }
+
+def parse_header_batch(records):
+    """Parse [(uid, raw header, message size)] into email info dicts, in order"""
+    return [parse_header_block(*record) for record in records]
+
+def parse_sync_batch(msg_data):
+    """Parse one sync FETCH response into (uid, day, sender, size, subject, from, attachments) rows
+
+    Messages without a usable UID or INTERNALDATE are skipped; a message whose
+    attachment structure cannot be read is indexed without attachments.
+    """
+    rows = []
+    for item in parse_fetch_response(msg_data):
+        try:
+            uid = int(item[b'UID'])
+            size = int(item.get(b'RFC822.SIZE') or 0)
+        except (KeyError, TypeError, ValueError):
+            continue
+        day = parse_internaldate_day(item.get(b'INTERNALDATE'))
+        if day is None:
+            continue
+        raw_fields = next((value for key, value in item.items() if key.startswith(b'BODY[')), None)
+        fields = HEADER_PARSER.parsebytes(raw_fields or b'')
+        sender = decode_header_value(fields.get("from", ""))
+        subject = decode_header_value(fields.get("subject", ""))
+        try:
+            attachments = list(walk_bodystructure(item.get(b'BODYSTRUCTURE'), decode_header_value))
+        except Exception:
+            # A malformed BODYSTRUCTURE must not keep the message out of the date index
+            attachments = []
+        rows.append((uid, day, sender_address(sender), size, subject, sender, attachments))
+    return rows
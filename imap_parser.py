@@ -0,0 +1,67 @@
+import re
+
+# One token of a FETCH response: parenthesis, quoted string, literal marker or atom.
+# Atoms may carry a section in brackets, e.g. BODY[HEADER.FIELDS (FROM SUBJECT)]
+TOKEN_RE = re.compile(rb'''\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|\{(\d+)\}|([^\s()"{\[]+(?:\[[^\]]*\][^\s()"{]*)?))''')
+UNESCAPE_RE = re.compile(rb'\\(.)')
+
+OPEN = object()
+CLOSE = object()
+
+def _tokens(msg_data):
+    """Tokenize the (text, literal) pieces imaplib returns for a FETCH"""
+    for item in msg_data:
+        if isinstance(item, tuple):
+            text, literal = item
+        else:
+            text, literal = item, None
+        if not text:
+            continue
+        pos = 0
+        while True:
+            match = TOKEN_RE.match(text, pos)
+            if not match or match.end() == pos:
+                break
+            pos = match.end()
+            open_paren, close_paren, quoted, literal_marker, atom = match.groups()
+            if open_paren:
+                yield OPEN
+            elif close_paren:
+                yield CLOSE
+            elif quoted is not None:
+                yield UNESCAPE_RE.sub(rb'\1', quoted)
+            elif literal_marker is not None:
+                yield literal
+            elif atom == b'NIL':
+                yield None
+            else:
+                yield atom
+
+def _parse_list(tokens):
+    items = []
+    for token in tokens:
+        if token is OPEN:
+            items.append(_parse_list(tokens))
+        elif token is CLOSE:
+            return items
+        else:
+            items.append(token)
+    return items
+
+def parse_fetch_response(msg_data):
+    """Parse a FETCH response into one {item name: value} dict per message
+
+    Item names are uppercased bytes (b'UID', b'BODYSTRUCTURE',
+    b'BODY[HEADER.FIELDS (FROM SUBJECT)]'); lists become nested Python
+    lists, NIL becomes None and literals are returned as bytes.
+    """
+    tokens = _tokens(msg_data)
+    messages = []
+    for token in tokens:
+        if token is not OPEN:
+            # Message sequence number
+            continue
+        items = _parse_list(tokens)
+        messages.append({items[i].upper(): items[i + 1] for i in range(0, len(items) - 1, 2)
+                         if isinstance(items[i], bytes)})
+    return messages
@@ -0,0 +1,181 @@
+import imaplib
+import select
+import ssl
+import threading
+import time
+from metrics import metrics
+from config import IMAP_PORT, IMAP_TIMEOUT, KEEPALIVE_INTERVAL, SESSION_CHECK_AFTER, RECONNECT_ATTEMPTS
+
+# Commands that can safely be sent again after the connection died mid-way
+IDEMPOTENT_COMMANDS = {'SEARCH', 'FETCH', 'STATUS', 'NOOP', 'SELECT', 'EXAMINE', 'CAPABILITY'}
+
+CONNECTION_ERRORS = (imaplib.IMAP4.abort, OSError, ssl.SSLError)
+
+class ResumableIMAP4_SSL(imaplib.IMAP4_SSL):
+    """IMAP4_SSL that offers a previous TLS session to skip the full handshake"""
+
+    def __init__(self, host, port, ssl_context, timeout=None, tls_session=None):
+        self.tls_session = tls_session
+        super().__init__(host, port, ssl_context=ssl_context, timeout=timeout)
+
+    def _create_socket(self, timeout):
+        sock = imaplib.IMAP4._create_socket(self, timeout)
+        return self.ssl_context.wrap_socket(sock, server_hostname=self.host, session=self.tls_session)
+
+class ImapSession:
+    """Self-healing IMAP connection used in place of a bare IMAP4_SSL
+
+    While idle a keepalive thread sends NOOPs so Gmail does not drop the
+    connection. Before each command a dead socket is detected and replaced by
+    a new connection that resumes the previous TLS session, logs in and
+    re-selects the mailbox. Idempotent commands interrupted by a dropped
+    connection are retried once on the new one.
+    """
+
+    def __init__(self, host, email_address, password, mailbox, readonly=False, keepalive=True):
+        self.host = host
+        self.email_address = email_address
+        self.password = password
+        self.mailbox = mailbox
+        self.readonly = readonly
+        self.ssl_context = ssl.create_default_context()
+        self.tls_session = None
+        self.imap = None
+        self.lock = threading.RLock()
+        self.last_used = time.time()
+        self.closed = threading.Event()
+        self.keepalive_thread = None
+        if keepalive:
+            self.keepalive_thread = threading.Thread(target=self._keepalive, name="imap-keepalive", daemon=True)
+
+    def open(self):
+        """Connect, log in and select the mailbox, returning the LOGIN response"""
+        with self.lock:
+            result = self._open()
+        if self.keepalive_thread and not self.keepalive_thread.is_alive():
+            self.keepalive_thread.start()
+        return result
+
+    def _open(self):
+        self.imap = ResumableIMAP4_SSL(self.host, IMAP_PORT, self.ssl_context,
+                                       timeout=IMAP_TIMEOUT, tls_session=self.tls_session)
+        result = self.imap.login(self.email_address, self.password)
+        self.imap.select(self.mailbox, readonly=self.readonly)
+        # TLS 1.3 tickets arrive after the handshake, so grab the session once traffic has flowed
+        self.tls_session = self.imap.sock.session
+        if self.imap.sock.session_reused:
+            metrics.incr('session.tls_resumed')
+        self.last_used = time.time()
+        return result
+
+    def reconnect(self):
+        """Replace the connection with a fresh, authenticated and selected one"""
+        with self.lock:
+            self._drop()
+            start = time.perf_counter()
+            for attempt in range(RECONNECT_ATTEMPTS):
+                try:
+                    self._open()
+                    break
+                except CONNECTION_ERRORS:
+                    self._drop()
+                    if attempt == RECONNECT_ATTEMPTS - 1:
+                        raise
+                    time.sleep(2 ** attempt)
+            metrics.observe('session.reconnect', time.perf_counter() - start)
+            metrics.incr('session.reconnects')
+
+    def _drop(self):
+        if self.imap:
+            try:
+                self.imap.shutdown()
+            except Exception:
+                pass
+        self.imap = None
+
+    def _is_alive(self):
+        """Cheap liveness check before a command, sending a NOOP only when in doubt"""
+        if self.imap is None:
+            return False
+        try:
+            # An idle connection has nothing to read; readable means EOF, BYE or pending data
+            readable, _, _ = select.select([self.imap.sock], [], [], 0)
+            if readable or time.time() - self.last_used > SESSION_CHECK_AFTER:
+                self.imap.noop()
+            return True
+        except CONNECTION_ERRORS:
+            return False
+
+    def _call(self, command, method, *args):
+        with self.lock:
+            if not self._is_alive():
+                self.reconnect()
+            try:
+                response = getattr(self.imap, method)(*args)
+            except CONNECTION_ERRORS:
+                if command.upper() not in IDEMPOTENT_COMMANDS:
+                    self._drop()
+                    raise
+                metrics.incr('session.retries')
+                self.reconnect()
+                response = getattr(self.imap, method)(*args)
+            self.last_used = time.time()
+            return response
+
+    def uid(self, command, *args):
+        return self._call(command, 'uid', command, *args)
+
+    def search(self, charset, *criteria):
+        return self._call('SEARCH', 'search', charset, *criteria)
+
+    def fetch(self, message_set, message_parts):
+        return self._call('FETCH', 'fetch', message_set, message_parts)
+
+    def status(self, mailbox, names):
+        return self._call('STATUS', 'status', mailbox, names)
+
+    def noop(self):
+        return self._call('NOOP', 'noop')
+
+    def select(self, mailbox='INBOX', readonly=False):
+        self.mailbox = mailbox
+        self.readonly = readonly
+        return self._call('SELECT', 'select', mailbox, readonly)
+
+    def response(self, code):
+        """Pop the untagged responses of type code, e.g. ESEARCH, left by the last command"""
+        with self.lock:
+            if self.imap is None:
+                return code, [None]
+            return self.imap.response(code)
+
+    @property
+    def capabilities(self):
+        return self.imap.capabilities if self.imap else ()
+
+    def logout(self):
+        self.closed.set()
+        with self.lock:
+            if self.imap:
+                try:
+                    return self.imap.logout()
+                finally:
+                    self.imap = None
+
+    def _keepalive(self):
+        while not self.closed.wait(KEEPALIVE_INTERVAL / 4):
+            if time.time() - self.last_used < KEEPALIVE_INTERVAL:
+                continue
+            # Skip this round if a foreground command holds the connection
+            if not self.lock.acquire(blocking=False):
+                continue
+            try:
+                if self.imap is not None and not self.closed.is_set():
+                    self.imap.noop()
+                    self.last_used = time.time()
+                    metrics.incr('session.keepalives')
+            except CONNECTION_ERRORS:
+                # Reconnect lazily on the next command
+                self._drop()
+            finally:
+                self.lock.release()
@@ -2,9 +2,13 @@ import sys
 import signal
 from gmail_client import GmailClient
 from email_search import EmailSearch
-from display_utils import display_email_list, display_email_brief
+from display_utils import display_email_list, display_email_brief, display_analytics, display_metrics, display_size_report
 from config import EMAIL, PASSWORD, DEFAULT_EMAIL_LIMIT, DEFAULT_DATE_LIMIT
+from search_utils import parse_size
 from date_range_picker import get_date_range
+from prefetcher import BodyPrefetcher
+from range_preview import RangePreview
+from metrics import metrics
 
 def signal_handler(sig, frame):
     """Handle keyboard interrupt (Ctrl+C) gracefully"""
@@ -21,6 +25,17 @@ def get_credentials():
         print("\n\n👋 Goodbye! Exiting...")
         sys.exit(0)
 
+def prompt_size(prompt):
+    """Ask for a size until it parses, None when left empty"""
+    while True:
+        answer = input(prompt).strip()
+        if not answer:
+            return None
+        size = parse_size(answer)
+        if size is not None:
+            return size
+        print(f"❌ Invalid size: '{answer}'. Enter a number with an optional KB, MB or GB, e.g. '1.5MB'")
+
 def main():
     """Main user loop"""
     
@@ -36,12 +51,16 @@ def main():
     # Create email search instance
     email_search = EmailSearch(gmail)
     
+    # Prefetch bodies of listed emails while the user reads the list
+    gmail.prefetcher = BodyPrefetcher(gmail)
+    
     current_emails = []
     
     print("\n🚀 Enhanced Gmail Interactive Client")
     print("=" * 50)
     
     while True:
+        gmail.prefetcher.resume()
         try:
             print("\n📋 MENU:")
             print("1. 📧 Email List (Recent 50)")
@@ -49,17 +68,24 @@ def main():
             print("3. 🔎 Search Emails by Query")
             print("4. 📅 Search by Date")
             print("5. 📅 Date Range Picker (GUI)")
-            print("6. 🚪 Exit")
+            print("6. 🔤 Quick Search (Subject/Sender, Typo Tolerant)")
+            print("7. 📈 Mailbox Analytics")
+            print("8. 📎 Attachments & Largest Emails")
+            print("9. 📊 Session Stats")
+            print("10. 🚪 Exit")
             
-            choice = input("\nEnter your choice (1-6): ").strip()
+            choice = input("\nEnter your choice (1-10): ").strip()
         except KeyboardInterrupt:
             print("\n\n👋 Goodbye! Exiting Gmail Client...")
             break
         
+        gmail.prefetcher.pause()
+        
         if choice == '1':
             print("\n🔄 Fetching recent emails...")
             current_emails = gmail.fetch_email_list(limit=DEFAULT_EMAIL_LIMIT)
             display_email_list(current_emails)
+            gmail.prefetcher.schedule(current_emails)
             
         elif choice == '2':
             try:
@@ -84,6 +110,7 @@ def main():
                     print(f"\n🔄 Searching for: {query} (smart sorting: relevance → date → alphabetical)")
                     current_emails = email_search.search_emails_by_query(query, limit, "smart")
                     display_email_list(current_emails, show_scores=True)
+                    gmail.prefetcher.schedule(current_emails)
                 else:
                     print("❌ Please enter a search query")
             except KeyboardInterrupt:
@@ -100,6 +127,7 @@ def main():
                     print(f"\n🔄 Searching emails for: {date_query}")
                     current_emails = email_search.search_emails_by_date(date_query, limit)
                     display_email_list(current_emails)
+                    gmail.prefetcher.schedule(current_emails)
                 else:
                     print("❌ Please enter a date query")
             except KeyboardInterrupt:
@@ -112,37 +140,35 @@ def main():
                 print("\n📅 Opening Date Range Picker...")
                 print("💡 Use the GUI to select your date range!")
                 
-                date_range = get_date_range()
+                # Count the range as it is picked, from the local index where possible
+                preview = RangePreview(gmail)
+                try:
+                    date_range = get_date_range(preview)
+                finally:
+                    preview.close()
                 
                 if date_range['confirmed']:
-                    print("\n🔄 Searching emails in selected date range...")
-                    current_emails = email_search.search_emails_by_date_range(
-                        date_range['start_date'], 
-                        date_range['end_date'], 
-                        date_range['limit']
-                    )
-                    
-                    # Prompt user for additional query
+                    # Prompt user for additional query, searched together with the range
                     query = input("\nEnter additional query for this range (or press Enter to skip): ").strip()
                     if query:
-                        print(f"\n🔄 Filtering for: {query} (within selected date range)")
-                        # Filter the already fetched emails from the date range
-                        from search_utils import get_related_words
-                        related_words = get_related_words(query)
-                        print(f"🔍 Filter terms: {related_words}")
-                        
-                        filtered_emails = []
-                        for email in current_emails:
-                            email_text = (email['subject'] + ' ' + email['from'] + ' ' + email.get('body', '')).lower()
-                            # Check if any of the related words are in the email
-                            if any(word.lower() in email_text for word in related_words):
-                                filtered_emails.append(email)
-                        
-                        current_emails = filtered_emails
-                        print(f"📧 Found {len(current_emails)} emails matching '{query}' in the selected date range")
+                        print(f"\n🔄 Searching for: {query} (within selected date range)")
+                        current_emails = email_search.search_emails_by_date_range_and_query(
+                            date_range['start_date'],
+                            date_range['end_date'],
+                            query,
+                            date_range['limit']
+                        )
+                    else:
+                        print("\n🔄 Searching emails in selected date range...")
+                        current_emails = email_search.search_emails_by_date_range(
+                            date_range['start_date'], 
+                            date_range['end_date'], 
+                            date_range['limit']
+                        )
                     
                     if current_emails:
                         display_email_list(current_emails)
+                        gmail.prefetcher.schedule(current_emails)
                     else:
                         print("❌ No emails found containing the query within the selected range")
                 else:
@@ -155,11 +181,65 @@ def main():
                 continue
                 
         elif choice == '6':
+            try:
+                query = input("\nEnter subject or sender text (typos are OK): ").strip()
+                if query:
+                    print(f"\n🔄 Searching subjects and senders for: {query}")
+                    current_emails = email_search.search_emails_by_text(query, DEFAULT_EMAIL_LIMIT)
+                    display_email_list(current_emails, show_scores=True)
+                    gmail.prefetcher.schedule(current_emails)
+                else:
+                    print("❌ Please enter a search query")
+            except KeyboardInterrupt:
+                print("\n❌ Operation cancelled")
+                continue
+            
+        elif choice == '7':
+            try:
+                date_query = input("\nEnter time window (e.g., 'march 2025', '2024', 'july') or press Enter for all: ").strip()
+                top_input = input("How many top senders? (default: 10): ").strip()
+                top_n = int(top_input) if top_input.isdigit() else 10
+                period = input("Group volume by day, week or month? (default: month): ").strip().lower()
+                if period not in ('day', 'week', 'month'):
+                    period = 'month'
+                
+                report = email_search.analyze_mailbox(date_query, top_n, period)
+                display_analytics(report)
+            except KeyboardInterrupt:
+                print("\n❌ Operation cancelled")
+                continue
+            
+        elif choice == '8':
+            try:
+                mode = input("\n1. Search attachments  2. Largest emails (default: 1): ").strip()
+                if mode == '2':
+                    date_query = input("Enter time window (e.g., 'march 2025', '2024') or press Enter for all: ").strip()
+                    print("\n🔄 Ranking synced emails by size...")
+                    current_emails = email_search.find_largest_emails(date_query, DEFAULT_EMAIL_LIMIT)
+                    display_size_report(current_emails, "📦 LARGEST EMAILS")
+                else:
+                    name = input("\nFilename contains (or press Enter for any): ").strip()
+                    mime_type = input("Type, e.g. 'pdf' or 'image' (or press Enter for any): ").strip()
+                    min_size = prompt_size("Minimum size, e.g. '1MB' (or press Enter for none): ")
+                    max_size = prompt_size("Maximum size, e.g. '20MB' (or press Enter for none): ")
+                    
+                    print("\n🔄 Searching synced attachments...")
+                    current_emails = email_search.search_attachments(name, mime_type, min_size, max_size, DEFAULT_EMAIL_LIMIT)
+                    display_size_report(current_emails, "📎 ATTACHMENTS")
+                gmail.prefetcher.schedule(current_emails)
+            except KeyboardInterrupt:
+                print("\n❌ Operation cancelled")
+                continue
+            
+        elif choice == '9':
+            display_metrics(metrics)
+            
+        elif choice == '10':
             print("\n👋 Goodbye!")
             break
             
         else:
-            print(f"❌ Invalid choice: '{choice}'. Please enter 1-6")
+            print(f"❌ Invalid choice: '{choice}'. Please enter 1-10")
     
     gmail.disconnect()
 
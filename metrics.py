@@ -0,0 +1,64 @@
+import time
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+class Metrics:
+    """Session-wide counters and timings shown in the stats view"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(int)
+        self.timings = defaultdict(lambda: [0, 0.0, 0.0])  # count, total, max
+        self.gauges = {}               # name -> latest value
+        self.events = deque(maxlen=50) # (time, name, message), newest last
+
+    def incr(self, name, amount=1):
+        if not amount:
+            # Keep counters that never moved out of the stats
+            return
+        with self.lock:
+            self.counters[name] += amount
+
+    def observe(self, name, seconds):
+        with self.lock:
+            timing = self.timings[name]
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    def gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def event(self, name, message):
+        """Record a notable decision, e.g. a tuning change, for the stats view"""
+        with self.lock:
+            self.events.append((time.time(), name, message))
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def hit_rate(self, prefix):
+        """Hit rate of a '<prefix>.hits' / '<prefix>.misses' counter pair, or None"""
+        hits = self.counters.get(f"{prefix}.hits", 0)
+        misses = self.counters.get(f"{prefix}.misses", 0)
+        if hits + misses == 0:
+            return None
+        return hits / (hits + misses)
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counters), {name: tuple(timing) for name, timing in self.timings.items()}
+
+    def recent(self, count=10):
+        """Latest gauges and the last count events"""
+        with self.lock:
+            return dict(self.gauges), list(self.events)[-count:]
+
+metrics = Metrics()
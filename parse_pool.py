@@ -0,0 +1,96 @@
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from config import PARSE_POOL_THRESHOLD, PARSE_WORKERS
+from metrics import metrics
+
+_executor = None
+
+def _workers():
+    return PARSE_WORKERS or os.cpu_count() or 1
+
+def get_executor():
+    """The shared parse pool, started on first use; None when it cannot help or start"""
+    global _executor
+    if _executor is None and _workers() > 1:
+        try:
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                # Forking directly would copy the keepalive and prefetch threads' locks
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload(['header_parser'])
+            else:
+                context = multiprocessing.get_context()
+            _executor = ProcessPoolExecutor(max_workers=_workers(), mp_context=context)
+        except Exception:
+            return None
+    return _executor
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+class ParseStage:
+    """Parse fetched batches in worker processes while the next batch downloads
+
+    Each submitted batch is one task, so only raw bytes travel to the workers
+    and parsed rows come back once per batch. Finished batches are handed
+    back in submit order as soon as they are ready, and at most two tasks
+    per worker are kept in flight, so neither raw responses nor parsed rows
+    pile up over a long fetch. Below PARSE_POOL_THRESHOLD messages, or with
+    a single core, batches are parsed in-process since starting workers
+    would cost more than it saves.
+    """
+
+    def __init__(self, total, threshold=PARSE_POOL_THRESHOLD):
+        self.executor = get_executor() if total >= threshold else None
+        self.window = 2 * _workers()
+        self.pending = deque()   # [future, parse, raw batch or None once parsed, key]
+
+    def submit(self, parse, batch, key=None):
+        """Queue batch for parsing; returns [(key, rows)] of the batches finished so far, in order"""
+        if self.executor is not None:
+            try:
+                self.pending.append([self.executor.submit(parse, batch), parse, batch, key])
+                metrics.incr('parse.pool_batches')
+            except Exception:
+                # Pool broken (e.g. a worker was killed), parse here from now on
+                self.executor = None
+        if self.executor is None:
+            self.pending.append([self._parse_inline(parse, batch), None, None, key])
+
+        finished = []
+        # Block on the oldest task once the window is full
+        while self.pending and (len(self.pending) > self.window or self._ready(self.pending[0])):
+            finished.append(self._pop())
+        for entry in self.pending:
+            if isinstance(entry[0], Future) and entry[0].done() and entry[0].exception() is None:
+                # Parsed, the raw batch is only kept for the inline fallback
+                entry[2] = None
+        return finished
+
+    def results(self):
+        """Yield (key, rows) of the remaining batches, in order"""
+        while self.pending:
+            yield self._pop()
+
+    def _ready(self, entry):
+        return not isinstance(entry[0], Future) or entry[0].done()
+
+    def _pop(self):
+        rows, parse, batch, key = self.pending.popleft()
+        if isinstance(rows, Future):
+            try:
+                with metrics.timer('parse.pool_wait'):
+                    rows = rows.result()
+            except Exception:
+                rows = self._parse_inline(parse, batch)
+        return key, rows
+
+    def _parse_inline(self, parse, batch):
+        with metrics.timer('parse.inline'):
+            rows = parse(batch)
+        metrics.incr('parse.inline_batches')
+        return rows
@@ -0,0 +1,138 @@
+import threading
+from collections import OrderedDict, deque
+from gmail_client import parse_email_message
+from metrics import metrics
+from config import PREFETCH_COUNT, PREFETCH_BYTE_BUDGET
+
+class BodyPrefetcher:
+    """Fetch the bodies of the top listed emails in the background
+
+    The worker uses its own read-only connection, waits while the foreground
+    is busy and keeps fetched bodies within a byte budget, so opening a listed
+    email with option 2 usually needs no round trip.
+    """
+
+    def __init__(self, gmail_client, count=PREFETCH_COUNT, byte_budget=PREFETCH_BYTE_BUDGET):
+        self.gmail_client = gmail_client
+        self.count = count
+        self.byte_budget = byte_budget
+        self.cache = OrderedDict()  # uid -> (email_data, size), oldest first
+        self.cache_bytes = 0
+        self.queue = deque()
+        self.in_flight = None
+        self.foreground = False
+        self.stopped = False
+        self.condition = threading.Condition()
+        self.imap = None
+        self.thread = None
+
+    def schedule(self, emails):
+        """Queue the top listed emails, replacing whatever was still queued"""
+        if not self.count:
+            return
+        with self.condition:
+            self.queue.clear()
+            for email_info in emails[:self.count]:
+                uid = str(email_info['uid'])
+                size = email_info.get('message_size')
+                if uid in self.cache:
+                    continue
+                if size and size > self.byte_budget:
+                    metrics.incr('prefetch.skipped')
+                    continue
+                self.queue.append(uid)
+            self.condition.notify_all()
+
+        if self.queue and self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="body-prefetcher", daemon=True)
+            self.thread.start()
+
+    def pause(self):
+        """Hold the worker while a foreground command runs"""
+        with self.condition:
+            self.foreground = True
+
+    def resume(self):
+        with self.condition:
+            self.foreground = False
+            self.condition.notify_all()
+
+    def take(self, uid):
+        """Return a prefetched email, waiting if it is being fetched right now"""
+        uid = str(uid)
+        with self.condition:
+            while self.in_flight == uid:
+                self.condition.wait()
+
+            entry = self.cache.get(uid)
+            if entry:
+                self.cache.move_to_end(uid)
+                metrics.incr('prefetch.hits')
+                return entry[0]
+
+            # The foreground fetches it now, no point prefetching it later
+            metrics.incr('prefetch.misses')
+            if uid in self.queue:
+                self.queue.remove(uid)
+            return None
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.stopped and (self.foreground or not self.queue):
+                    self.condition.wait()
+                if self.stopped:
+                    break
+                uid = self.queue.popleft()
+                self.in_flight = uid
+
+            email_data = None
+            size = 0
+            try:
+                if self.imap is None:
+                    self.imap = self.gmail_client.open_connection(readonly=True)
+                with metrics.timer('prefetch.fetch'):
+                    res, msg_data = self.imap.uid('FETCH', uid, "(BODY.PEEK[])")
+                if res == 'OK' and msg_data and isinstance(msg_data[0], tuple):
+                    size = len(msg_data[0][1])
+                    email_data = parse_email_message(uid, msg_data[0][1])
+            except Exception:
+                # Give up on this listing rather than hammering a failing connection
+                metrics.incr('prefetch.errors')
+                self._close()
+                with self.condition:
+                    self.queue.clear()
+
+            with self.condition:
+                self.in_flight = None
+                if email_data:
+                    self._store(uid, email_data, size)
+                self.condition.notify_all()
+
+        self._close()
+
+    def _store(self, uid, email_data, size):
+        if size > self.byte_budget:
+            return
+        while self.cache and self.cache_bytes + size > self.byte_budget:
+            _, (_, evicted_size) = self.cache.popitem(last=False)
+            self.cache_bytes -= evicted_size
+        self.cache[uid] = (email_data, size)
+        self.cache_bytes += size
+        metrics.incr('prefetch.fetched')
+        metrics.incr('prefetch.bytes', size)
+
+    def _close(self):
+        if self.imap:
+            try:
+                self.imap.logout()
+            except Exception:
+                pass
+            self.imap = None
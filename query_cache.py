@@ -0,0 +1,38 @@
+import time
+from collections import OrderedDict
+from config import QUERY_CACHE_SIZE, QUERY_CACHE_TTL
+
+class QueryCache:
+    """LRU cache of search results tagged with the mailbox state they were computed at
+
+    Entries hold the full list of matching UIDs (before the display limit)
+    and the STATUS values (UIDVALIDITY, UIDNEXT, MESSAGES, HIGHESTMODSEQ)
+    seen when the search ran. Callers decide whether an entry is still valid
+    or can be brought up to date with a delta search.
+    """
+
+    def __init__(self, max_entries=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if self.ttl and time.time() - entry['time'] > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, state, uids):
+        if not self.max_entries:
+            return
+        self.entries[key] = {'state': state, 'uids': uids, 'time': time.time()}
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
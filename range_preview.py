@@ -0,0 +1,197 @@
+import imaplib
+import re
+import threading
+import time
+from datetime import date
+from gmail_client import fetch_literals
+from header_parser import HEADER_PARSER, decode_header_value
+from metrics import metrics
+from config import PREVIEW_SAMPLES, PREVIEW_DEBOUNCE
+
+ESEARCH_COUNT_RE = re.compile(rb'COUNT (\d+)')
+ESEARCH_ALL_RE = re.compile(rb'ALL ([\d:,]+)')
+
+def newest_uids(sequence_set, n):
+    """The n highest UIDs of an ESEARCH ALL sequence set such as b'3:7,12', highest first"""
+    uids = []
+    for part in reversed(sequence_set.split(b',')):
+        first, _, last = part.partition(b':')
+        low, high = sorted((int(first), int(last or first)))
+        for uid in range(high, low - 1, -1):
+            if len(uids) == n:
+                return uids
+            uids.append(uid)
+    return uids
+
+class RangePreview:
+    """Match count and a few sample subjects for a date range, computed off the UI thread
+
+    Requests are debounced and only the latest one is answered, so dragging
+    through dates costs one lookup once the user pauses. Synced days are
+    counted from the local date index; days outside it are counted by Gmail
+    with ESEARCH RETURN (COUNT ALL) on a separate read-only connection.
+    """
+
+    def __init__(self, gmail_client, samples=PREVIEW_SAMPLES, debounce=PREVIEW_DEBOUNCE):
+        self.gmail_client = gmail_client
+        self.samples = samples
+        self.debounce = debounce
+        self.condition = threading.Condition()
+        self.requested = None     # latest (start, end) asked for
+        self.requested_at = 0
+        self.pending = False
+        self.result = None
+        self.stopped = False
+        self.esearch = True       # cleared if the server rejects RETURN (...)
+        self.imap = None
+        self.thread = None
+
+    def request(self, start_date, end_date):
+        """Ask for a preview of [start_date, end_date]; repeated requests for the same range are free"""
+        with self.condition:
+            if (start_date, end_date) == self.requested:
+                return
+            self.requested = (start_date, end_date)
+            self.requested_at = time.monotonic()
+            self.pending = True
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="range-preview", daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def latest(self):
+        """The newest finished preview: a dict with start, end, count, subjects, source and error"""
+        with self.condition:
+            return self.result
+
+    def close(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        # Let a lookup in progress finish before its connection goes away,
+        # otherwise its next command would quietly log in again
+        if self.thread:
+            self.thread.join(timeout=5)
+        with self.condition:
+            imap, self.imap = self.imap, None
+        if imap:
+            try:
+                imap.logout()
+            except Exception:
+                pass
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopped:
+                    self.condition.wait()
+                # Debounce: wait until the range has been left alone for a moment
+                while not self.stopped:
+                    remaining = self.requested_at + self.debounce - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                if self.stopped:
+                    return
+                start_date, end_date = self.requested
+                self.pending = False
+
+            try:
+                with metrics.timer('preview'):
+                    result = self._compute(start_date, end_date)
+            except Exception as e:
+                result = {'start': start_date, 'end': end_date, 'count': None, 'subjects': [],
+                          'source': None, 'error': str(e)}
+            with self.condition:
+                self.result = result
+
+    def _compute(self, start_date, end_date):
+        since = start_date.toordinal()
+        until = end_date.toordinal()
+        index = self.gmail_client.date_index
+
+        count = 0
+        uids = []
+        sources = []
+        if not self.gmail_client.index_current:
+            edge = (since, until)
+        else:
+            edge = index.uncovered(since, until)
+            lo, hi = index.bounds(since, until)
+            count = hi - lo
+            # Rows are sorted by date, the newest come last
+            uids = list(reversed(index.uids[max(lo, hi - self.samples):hi]))
+            sources.append("local index")
+            metrics.incr('preview.local')
+
+        if edge:
+            # Everything uncovered is older than the synced window, so local samples stay first
+            edge_count, edge_uids = self._server_count(edge[0], edge[1])
+            count += edge_count
+            uids.extend(edge_uids[:self.samples - len(uids)])
+            sources.append("Gmail")
+            metrics.incr('preview.server')
+
+        return {'start': start_date, 'end': end_date, 'count': count, 'subjects': self._subjects(uids),
+                'source': " + ".join(sources), 'error': None}
+
+    def _connection(self):
+        with self.condition:
+            if self.stopped:
+                raise imaplib.IMAP4.abort("preview closed")
+            if self.imap is not None:
+                return self.imap
+        imap = self.gmail_client.open_connection(readonly=True)
+        with self.condition:
+            if not self.stopped:
+                self.imap = imap
+                return imap
+        # Closed while logging in
+        try:
+            imap.logout()
+        except Exception:
+            pass
+        raise imaplib.IMAP4.abort("preview closed")
+
+    def _server_count(self, since, until):
+        """(count, newest sample uids) for internal dates in [since, until] (day ordinals)"""
+        imap = self._connection()
+        since_str = date.fromordinal(since).strftime("%d-%b-%Y")
+        before_str = date.fromordinal(until + 1).strftime("%d-%b-%Y")
+        criteria = f'(SINCE "{since_str}" BEFORE "{before_str}")'
+
+        if self.esearch:
+            try:
+                # Hold the connection so no other command picks up our ESEARCH response
+                with imap.lock:
+                    res, _ = imap.uid('SEARCH', 'RETURN (COUNT ALL)', criteria)
+                    _, data = imap.response('ESEARCH')
+            except imaplib.IMAP4.abort:
+                raise
+            except imaplib.IMAP4.error:
+                res, data = 'BAD', None
+            line = data[-1] if data and data[-1] else b''
+            count_match = ESEARCH_COUNT_RE.search(line)
+            if res == 'OK' and count_match:
+                all_match = ESEARCH_ALL_RE.search(line)
+                return int(count_match.group(1)), newest_uids(all_match.group(1), self.samples) if all_match else []
+            # No ESEARCH support, use a plain SEARCH from now on
+            self.esearch = False
+
+        res, data = imap.uid('SEARCH', None, criteria)
+        found = data[0].split() if res == 'OK' and data[0] else []
+        return len(found), [int(uid) for uid in reversed(found[-self.samples:])]
+
+    def _subjects(self, uids):
+        """Subjects of uids, from the header cache or a small header fetch"""
+        cache = self.gmail_client.email_cache
+        subjects = {uid: cache[str(uid)]['subject'] for uid in uids if str(uid) in cache}
+        missing = [uid for uid in uids if uid not in subjects]
+        if missing:
+            res, msg_data = self._connection().uid('FETCH', ','.join(map(str, missing)),
+                                                   '(BODY.PEEK[HEADER.FIELDS (SUBJECT)])')
+            if res == 'OK':
+                for uid, _, raw_fields in fetch_literals(msg_data):
+                    fields = HEADER_PARSER.parsebytes(raw_fields or b'')
+                    subjects[uid] = decode_header_value(fields.get("subject", "No Subject"))
+        return [subjects[uid] for uid in uids if uid in subjects]
@@ -1,11 +1,27 @@
 import re
+import nltk
 from nltk.corpus import wordnet
 from datetime import datetime, timedelta
 import dateutil.parser
 import calendar
 
+_wordnet_checked = False
+
+def _ensure_wordnet():
+    """Download WordNet on first use, not at import: parse worker processes re-import the main module"""
+    global _wordnet_checked
+    if _wordnet_checked:
+        return
+    _wordnet_checked = True
+    try:
+        nltk.download('wordnet', quiet=True)
+        nltk.download('omw-1.4', quiet=True)
+    except:
+        pass
+
 def get_related_words(query):
     """Get related words using WordNet"""
+    _ensure_wordnet()
     synonyms = set()
     try:
         for syn in wordnet.synsets(query):
@@ -129,6 +145,28 @@ def parse_date_query(date_query):
     
     return None, None
 
+def date_query_range(parsed_date, date_type):
+    """First and last day (inclusive) covered by a parse_date_query result"""
+    if date_type == "single_date":
+        day = datetime.strptime(parsed_date, "%d-%b-%Y")
+        return day, day
+    elif date_type == "month_range":
+        month, year = parsed_date
+        return datetime(year, month, 1), datetime(year, month, calendar.monthrange(year, month)[1])
+    elif date_type == "year_range":
+        return datetime(parsed_date, 1, 1), datetime(parsed_date, 12, 31)
+    return None, None
+
+SIZE_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmg]?)b?\s*$', re.IGNORECASE)
+
+def parse_size(size_query):
+    """Parse sizes like '500', '200kb', '1.5 MB' into bytes, None if unparseable"""
+    match = SIZE_RE.match(size_query or '')
+    if not match:
+        return None
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** ' kmg'.index(unit.lower() or ' '))
+
 def sort_by_relevance(emails, related_words):
     """Sort emails by relevance score based on related words"""
     for email in emails:
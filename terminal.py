@@ -0,0 +1,95 @@
+import shutil
+import sys
+import time
+import unicodedata
+from functools import lru_cache
+from config import PAGER_ENABLED, PROGRESS_FPS
+
+@lru_cache(maxsize=65536)
+def char_width(char):
+    """Terminal columns taken by one character (a cached wcwidth)"""
+    if unicodedata.combining(char):
+        return 0
+    category = unicodedata.category(char)
+    if category in ('Cc', 'Cf', 'Mn', 'Me'):
+        return 0
+    if unicodedata.east_asian_width(char) in ('W', 'F'):
+        return 2
+    return 1
+
+def display_width(text):
+    if text.isascii():
+        return len(text)
+    return sum(char_width(char) for char in text)
+
+def clean(text):
+    """Collapse folded header lines and tabs so one value stays on one row"""
+    return ' '.join(str(text).split())
+
+def fit(text, width):
+    """Truncate text to width columns (marking the cut with ...) and pad it to exactly width"""
+    text = clean(text)
+    used = display_width(text)
+    if used <= width:
+        return text + ' ' * (width - used)
+
+    limit = width - 3
+    out = []
+    used = 0
+    for char in text:
+        w = char_width(char)
+        if used + w > limit:
+            break
+        out.append(char)
+        used += w
+    return ''.join(out) + '...' + ' ' * (limit - used)
+
+def write_frame(lines):
+    """Write a block of lines with a single write and flush"""
+    sys.stdout.write('\n'.join(lines) + '\n')
+    sys.stdout.flush()
+
+def page(lines, header=()):
+    """Show lines a screen at a time, repeating header on every page
+
+    Short output and non-interactive stdout are written in one frame.
+    """
+    rows = shutil.get_terminal_size().lines
+    body_rows = max(rows - len(header) - 1, 5)
+    if not PAGER_ENABLED or not sys.stdout.isatty() or len(lines) <= body_rows:
+        write_frame(list(header) + list(lines))
+        return
+
+    for start in range(0, len(lines), body_rows):
+        write_frame(list(header) + list(lines[start:start + body_rows]))
+        end = min(start + body_rows, len(lines))
+        if end >= len(lines):
+            break
+        try:
+            answer = input(f"-- {end}/{len(lines)} -- Enter for more, q to stop: ")
+        except (EOFError, KeyboardInterrupt):
+            print()
+            break
+        if answer.strip().lower() == 'q':
+            break
+
+class Progress:
+    """Single-line progress indicator redrawn at most PROGRESS_FPS times a second"""
+
+    def __init__(self, label, total, fps=PROGRESS_FPS):
+        self.label = label
+        self.total = total
+        self.interval = 1.0 / fps if fps else 0
+        self.last_draw = 0
+
+    def update(self, done):
+        now = time.monotonic()
+        if done < self.total and now - self.last_draw < self.interval:
+            return
+        self.last_draw = now
+        sys.stdout.write(f"\r{self.label}: {done}/{self.total}")
+        sys.stdout.flush()
+
+    def finish(self):
+        sys.stdout.write('\n')
+        sys.stdout.flush()
@@ -0,0 +1,120 @@
+"""FetchScheduler against the fake IMAP server in benchmarks/fake_imap.py
+
+Run from the project root: python -m pytest tests
+"""
+import imaplib
+import os
+import re
+import sys
+import time
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import fetch_scheduler
+from fake_imap import FakeImapServer, parse_uid_set
+from fetch_scheduler import AimdController, FetchScheduler
+
+ITEMS = "(RFC822.SIZE BODY.PEEK[HEADER])"
+
+class FakeClient:
+    """The two attributes FetchScheduler needs from GmailClient"""
+
+    def __init__(self, server):
+        self.server = server
+        self.imap = server.session()
+
+    def open_connection(self, readonly=False):
+        return self.server.session()
+
+class FailingServer(FakeImapServer):
+    """Answers NO for the batch containing fail_uid, and [THROTTLED] for the first throttle_count FETCHes"""
+
+    def __init__(self, count, fail_uid=None, throttle_count=0, **settings):
+        super().__init__(count, **settings)
+        self.fail_uid = fail_uid
+        self.throttle_count = throttle_count
+        self.throttled = 0
+
+    def fetch(self, message_set):
+        with self.lock:
+            throttle = self.throttled < self.throttle_count
+            self.throttled += throttle
+        if throttle:
+            return 'NO', [b'[THROTTLED] Account exceeded command or bandwidth limits. (Failure)']
+        if self.fail_uid in parse_uid_set(message_set):
+            return 'NO', [b'Some messages could not be FETCHed (Failure)']
+        return super().fetch(message_set)
+
+class FetchSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backoff = fetch_scheduler.FETCH_BACKOFF
+        fetch_scheduler.FETCH_BACKOFF = 0.2
+
+    def tearDown(self):
+        fetch_scheduler.FETCH_BACKOFF = self.backoff
+
+    def test_batches_come_back_in_order(self):
+        # Small chunks and jittery parallel requests, so batches finish out of order
+        server = FakeImapServer(3000, rtt=0.01, per_message=0.00002)
+        controller = AimdController(chunk=100, min_chunk=50, max_chunk=400)
+        controller.in_flight = 4
+        scheduler = FetchScheduler(FakeClient(server), controller)
+
+        fetched = []
+        for batch, msg_data in scheduler.fetch(server.uids(), ITEMS):
+            uids = [int(re.search(rb'UID (\d+)', item[0]).group(1)) for item in msg_data if isinstance(item, tuple)]
+            self.assertEqual(uids, batch)
+            fetched.extend(batch)
+        self.assertEqual(fetched, server.uids())
+
+    def test_failure_yields_a_prefix_then_raises(self):
+        server = FailingServer(2000, fail_uid=1234, rtt=0.01)
+        scheduler = FetchScheduler(FakeClient(server), AimdController(chunk=100, min_chunk=100, max_chunk=100))
+
+        fetched = []
+        with self.assertRaises(imaplib.IMAP4.error):
+            for batch, msg_data in scheduler.fetch(server.uids(), ITEMS):
+                fetched.extend(batch)
+        self.assertEqual(fetched, list(range(1, len(fetched) + 1)))
+        self.assertLess(len(fetched), 1234)
+        # Extra connections were logged out again
+        self.assertEqual(server.connections, 1)
+
+    def test_throttle_halves_settings_and_backs_off(self):
+        server = FailingServer(400, throttle_count=1, rtt=0.01)
+        controller = AimdController(chunk=400, min_chunk=50, max_chunk=400)
+        controller.in_flight = 2
+        scheduler = FetchScheduler(FakeClient(server), controller)
+
+        start = time.monotonic()
+        fetched = [uid for batch, _ in scheduler.fetch(server.uids(), ITEMS) for uid in batch]
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(fetched, server.uids())
+        self.assertGreaterEqual(elapsed, fetch_scheduler.FETCH_BACKOFF)
+        self.assertEqual(controller.ceiling, 1)
+        self.assertEqual(controller.in_flight, 1)
+
+    def test_throttled_halves_chunk_and_parallelism(self):
+        controller = AimdController(chunk=1000, min_chunk=50, max_chunk=5000)
+        controller.in_flight = 4
+        self.assertEqual(controller.throttled("throttled"), fetch_scheduler.FETCH_BACKOFF)
+        self.assertEqual((controller.chunk, controller.in_flight, controller.ceiling), (500, 2, 3))
+        # Throttling that persists doubles the wait
+        self.assertEqual(controller.throttled("throttled"), 2 * fetch_scheduler.FETCH_BACKOFF)
+        self.assertEqual((controller.chunk, controller.in_flight), (250, 1))
+
+    def test_persistent_throttle_gives_up(self):
+        server = FailingServer(100, throttle_count=100, rtt=0.001)
+        fetch_scheduler.FETCH_BACKOFF = 0.01
+        scheduler = FetchScheduler(FakeClient(server))
+        with self.assertRaises(fetch_scheduler.Throttled):
+            list(scheduler.fetch(server.uids(), ITEMS))
+        self.assertEqual(server.throttled, fetch_scheduler.FETCH_MAX_RETRIES + 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import math
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import chain
+from config import FUZZY_THRESHOLD
+
+WORD_RE = re.compile(r'\w+')
+
+def word_trigrams(word):
+    """Trigrams of a word padded like pg_trgm, so word starts and ends weigh in"""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def text_trigrams(text):
+    grams = set()
+    for word in WORD_RE.findall(text):
+        grams |= word_trigrams(word)
+    return grams
+
+def inner_trigrams(text):
+    """Unpadded trigrams, present in any text that contains text as a substring"""
+    grams = set()
+    for word in WORD_RE.findall(text):
+        grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+def _contains(posting, doc):
+    position = bisect_left(posting, doc)
+    return position < len(posting) and posting[position] == doc
+
+class TrigramIndex:
+    """Trigram index over subject and sender of every synced message
+
+    Each message gets a sequential document id. Postings map a trigram to
+    the ascending array of documents containing it, so adding a message
+    only appends. Substring queries verify the candidates in the rarest
+    posting, highest UID first; fuzzy queries rank by the share of query
+    trigrams a message contains, which tolerates typos like "invioce".
+    """
+
+    def __init__(self):
+        self.uids = array('I')   # document id -> uid, 0 once expunged
+        self.texts = []          # document id -> casefolded "subject\nsender"
+        self.doc_ids = {}        # uid -> document id
+        self.postings = {}       # trigram -> array of document ids
+        self.deleted = 0
+        self.ordered = True      # document ids ascend with uids
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def add(self, uid, subject, sender):
+        self.add_text(uid, f"{subject}\n{sender}".casefold())
+
+    def add_text(self, uid, text):
+        """Add a message by its casefolded "subject\nsender" text, as kept in texts"""
+        if uid in self.doc_ids:
+            return
+        doc = len(self.uids)
+        if self.uids and uid < self.uids[-1]:
+            self.ordered = False
+        self.uids.append(uid)
+        self.texts.append(text)
+        self.doc_ids[uid] = doc
+        for gram in text_trigrams(text):
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = array('I')
+            posting.append(doc)
+
+    def discard_missing(self, live_uids):
+        """Forget expunged messages, compacting once half the documents are dead"""
+        live_uids = set(live_uids)
+        for uid in [uid for uid in self.doc_ids if uid not in live_uids]:
+            self.uids[self.doc_ids.pop(uid)] = 0
+            self.deleted += 1
+        if self.deleted * 2 > len(self.uids):
+            self._compact()
+
+    def clear(self):
+        self.__init__()
+
+    def entries(self, start=0):
+        """(uid, text) of the documents from id start on, for replaying with add_text"""
+        return list(zip(self.uids[start:], self.texts[start:]))
+
+    def _compact(self):
+        # Renumbering in UID order lets substring queries walk postings backwards again
+        entries = sorted((uid, text) for uid, text in self.entries() if uid)
+        self.clear()
+        for uid, text in entries:
+            self.add_text(uid, text)
+
+    def search(self, query, limit=None, threshold=FUZZY_THRESHOLD):
+        """Return [(uid, score)] best first, at most limit of them
+
+        Messages containing the query as a substring score 1.0 (highest UID first),
+        followed by fuzzy matches ranked by trigram similarity. With a limit,
+        substring matching stops at the newest limit matches and fuzzy
+        matching stops early once enough of the best matches are found.
+        """
+        query = query.casefold().strip()
+        if not query:
+            return []
+        exact = self._substring_docs(query, limit)
+        fuzzy = []
+        if not limit:
+            fuzzy = self._fuzzy_docs(query, threshold, set(exact))
+        elif len(exact) < limit:
+            # Stricter thresholds merge fewer postings; stop at the first one
+            # that fills the limit, since it already holds the best matches
+            for level in sorted({max(0.8, threshold), max(0.6, threshold), threshold}, reverse=True):
+                fuzzy = self._fuzzy_docs(query, level, set(exact))
+                if len(exact) + len(fuzzy) >= limit:
+                    break
+
+        results = [(self.uids[doc], 1.0) for doc in exact]
+        fuzzy.sort(key=lambda match: (-match[1], -self.uids[match[0]]))
+        results.extend((self.uids[doc], score) for doc, score in fuzzy)
+        return results[:limit] if limit else results
+
+    def _substring_docs(self, query, limit=None):
+        """Documents containing query, highest UID first; with a limit only the first limit of them"""
+        grams = inner_trigrams(query)
+        if grams:
+            # Every match contains all of the query's trigrams, so the rarest
+            # posting holds every match
+            postings = sorted((self.postings.get(gram, ()) for gram in grams), key=len)
+            candidates = postings[0]
+            if len(postings) > 1 and candidates and not limit:
+                # Intersecting with the next rarest leaves few candidates to verify
+                candidates = sorted(set(candidates).intersection(postings[1]))
+        else:
+            # Too short for trigrams, scan the texts
+            candidates = range(len(self.texts))
+        texts = self.texts
+        uids = self.uids
+        if not self.ordered:
+            # Some messages were added out of UID order, e.g. cached by a
+            # search before the sync reached them
+            candidates = sorted(candidates, key=uids.__getitem__)
+        matches = []
+        for doc in reversed(candidates):
+            if uids[doc] and query in texts[doc]:
+                matches.append(doc)
+                if len(matches) == limit:
+                    break
+        return matches
+
+    def _fuzzy_docs(self, query, threshold, exclude):
+        grams = sorted(text_trigrams(query), key=lambda gram: len(self.postings.get(gram, ())))
+        if not grams:
+            return []
+        needed = max(1, math.ceil(threshold * len(grams)))
+
+        # A document sharing `needed` trigrams must appear in one of the
+        # len(grams) - needed + 1 rarest postings, so only those are merged
+        split = len(grams) - needed + 1
+        counts = Counter(chain.from_iterable(self.postings.get(gram, ()) for gram in grams[:split]))
+        common = [self.postings[gram] for gram in grams[split:] if gram in self.postings]
+
+        # Walk the common postings rarest first, dropping documents that can
+        # no longer reach `needed` so later lookups only touch the survivors
+        alive = [doc for doc, count in counts.items() if count + len(common) >= needed]
+        for position, posting in enumerate(common):
+            if not alive:
+                break
+            if len(posting) > 8 * len(alive):
+                # Bisecting for a few documents beats scanning a long posting
+                hits = [doc for doc in alive if _contains(posting, doc)]
+            else:
+                hits = set(alive).intersection(posting)
+            counts.update(hits)
+            remaining = len(common) - position - 1
+            alive = [doc for doc in alive if counts[doc] + remaining >= needed]
+
+        uids = self.uids
+        return [(doc, counts[doc] / len(grams)) for doc in alive if uids[doc] and doc not in exclude]